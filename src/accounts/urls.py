@@ -2,7 +2,7 @@
 from django.urls import path,include
 from .views.views import TenantLoginView,TenantSignupView,user_logout
 from .views.emp_views_utils import request_attendance_correction
-from .views.hr_views_utils import hr_mark_attendance,hr_view_attendance,hr_review_requests,hr_employee_approval_list, hr_employee_approval_detail
+from .views.hr_views_utils import hr_mark_attendance,hr_bulk_mark_attendance,hr_attendance_heatmap,hr_view_attendance,hr_review_requests,hr_employee_approval_list, hr_employee_approval_detail
 from .views.home_views import employee_home, hr_home
 from tenants.tenant_views import tenant_home,tenant_selection
 urlpatterns = [
@@ -19,6 +19,8 @@ urlpatterns = [
     path('hr/home/', hr_home, name='hr_home'),
     path('hr/view_attendance/', hr_view_attendance, name='hr_view_attendance'),
     path('hr/mark_attendance/', hr_mark_attendance, name='hr_mark_attendance'),
+    path('hr/bulk_mark_attendance/', hr_bulk_mark_attendance, name='hr_bulk_mark_attendance'),
+    path('hr/attendance_heatmap/', hr_attendance_heatmap, name='hr_attendance_heatmap'),
     path('hr/review_requests/', hr_review_requests, name='hr_review_requests'),
     path('hr/employee-approvals/', hr_employee_approval_list, name='hr-employee-approvals'),
     path('hr/employee-approval/<uuid:application_id>/', hr_employee_approval_detail, name='hr-employee-approval-detail'),
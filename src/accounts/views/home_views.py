@@ -5,6 +5,7 @@ from datetime import date
 from .views import get_tenant_from_subdomain
 from accounts.models import HRProfile, EmployeeProfile,Account,Department
 from attendance.models import Attendance, AttendanceRequest
+from attendance.services import daily_summary_stats, employee_month_stats
 from datetime import datetime, timedelta
 from django.db.models import Count
 from django.conf import settings
@@ -89,19 +90,13 @@ def employee_home(request):
        
         
         today = datetime.now().date()
-        first_day = today.replace(day=1)
         
-        # Get all attendance records for current month
-        attendance_records = Attendance.objects.filter(
-            employee=employee_profile,
-            date__gte=first_day,
-            date__lte=today
-        ).order_by('date')
-        
-        # Calculate attendance percentage
-        total_days = attendance_records.count()
-        present_days = attendance_records.filter(status='PRESENT').count()
-        attendance_percentage = (present_days / total_days * 100) if total_days > 0 else 0
+        # Month's records and counts in one query
+        stats = employee_month_stats(employee_profile, today)
+        attendance_records = stats['days']
+        total_days = stats['total']
+        present_days = stats['counts']['PRESENT']
+        attendance_percentage = stats['present_percentage']
         
         # Get leave balance
         leave_balance = employee_profile.total_leaves
@@ -148,6 +143,7 @@ def hr_home(request):
         # Filter employees based on HR's department access
         if hr_profile.is_admin or not hr_profile.departments.exists():
             # Admin HR or HR with no departments = see all employees
+            hr_departments = None
             accessible_employees = EmployeeProfile.objects.all()
             total_employees = accessible_employees.count()
         else:
@@ -164,16 +160,13 @@ def hr_home(request):
             employee__in=accessible_employees
         ).count()
         
-        # Get today's attendance summary (only for accessible employees)
+        # Get today's attendance summary (only for accessible departments)
         today = date.today()
-        today_attendance = Attendance.objects.filter(
-            date=today,
-            employee__in=accessible_employees
-        )
-        present_today = today_attendance.filter(status='PRESENT').count()
-        absent_today = today_attendance.filter(status='ABSENT').count()
-        on_leave_today = today_attendance.filter(status='LEAVE').count()
-        not_marked_today = total_employees - (present_today + absent_today + on_leave_today)
+        today_stats = daily_summary_stats(today, departments=hr_departments)
+        present_today = today_stats['counts']['PRESENT']
+        absent_today = today_stats['counts']['ABSENT']
+        on_leave_today = today_stats['counts']['LEAVE']
+        not_marked_today = total_employees - today_stats['total']
         
         # Get recent attendance requests (only for accessible employees)
         recent_requests = AttendanceRequest.objects.filter(
@@ -1,14 +1,19 @@
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.conf import settings
 from accounts.models import Account
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from accounts.models import HRProfile
 from attendance.models import AttendanceRequest, Attendance
+from attendance.services import mark_attendance
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import urlencode
 from approvals.models import EmployeeApproval
 from django.contrib.auth.hashers import check_password
-from datetime import date
+from datetime import MAXYEAR, MINYEAR, date
+import uuid
 # View all employees attendance
 @login_required
 def hr_view_attendance(request):
@@ -94,15 +99,11 @@ def hr_mark_attendance(request):
         if not hr_profile.has_access_to_employee(employee):
             return HttpResponse("Access denied! You don't have permission to mark attendance for this employee.")
         
-        # Update or create attendance
-        attendance, created = Attendance.objects.update_or_create(
-            employee=employee,
-            date=date_str,
-            defaults={
-                'status': status,
-                'marked_by': hr_profile
-            }
-        )
+        # Update or create attendance (keeps the daily summary in step)
+        try:
+            mark_attendance(hr_profile, employee, date_str, status)
+        except ValueError as e:
+            return HttpResponse(f"Invalid attendance data: {e}")
         
         return redirect('hr_view_attendance')
     
@@ -124,6 +125,120 @@ def hr_mark_attendance(request):
     return render(request, 'accounts/hr/hr_mark_attendance.html', context)
 
 
+# Bulk mark attendance - one date, one status per employee, one statement
+@login_required
+def hr_bulk_mark_attendance(request):
+    if request.subdomain=="localhost" or request.subdomain==settings.MAIN_SUBDOMAIN:
+        return HttpResponse("Sorry! You can only access by your enterprise subdomain")
+    
+    account = Account.objects.get(user=request.user)
+    
+    if account.role.upper() != "HR":
+        return HttpResponse("Access denied!")
+    
+    from attendance.services import accessible_employees, bulk_mark_attendance
+    
+    hr_profile = HRProfile.objects.get(account=account)
+    
+    if request.method == 'POST':
+        date_str = request.POST.get('date', '')
+        try:
+            marked_date = parse_date(date_str)
+        except ValueError:
+            marked_date = None
+        if marked_date is None:
+            return HttpResponse("Invalid date", status=400)
+        # Fields are named status_<employee id>
+        statuses = {
+            key[len('status_'):]: value
+            for key, value in request.POST.items()
+            if key.startswith('status_') and value
+        }
+        try:
+            bulk_mark_attendance(hr_profile, marked_date, statuses)
+        except PermissionError:
+            return HttpResponse("Access denied! You don't have permission to mark attendance for some of these employees.")
+        except ValueError as e:
+            return HttpResponse(f"Invalid attendance data: {e}")
+        
+        return redirect(f"{reverse('hr_view_attendance')}?{urlencode({'date': marked_date.isoformat()})}")
+    
+    selected_date = date.today()
+    if request.GET.get('date'):
+        try:
+            selected_date = parse_date(request.GET['date'])
+        except ValueError:
+            selected_date = None
+        if selected_date is None:
+            return HttpResponse("Invalid date", status=400)
+    employees = accessible_employees(hr_profile).select_related('account__user', 'department').order_by('department__name', 'account__user__username')
+    marked = dict(
+        Attendance.objects.filter(date=selected_date, employee__in=employees).values_list('employee_id', 'status')
+    )
+    
+    context = {
+        'role':'hr',
+        'rows': [{'employee': emp, 'status': marked.get(emp.id, 'PRESENT')} for emp in employees],
+        'selected_date': selected_date.isoformat(),
+    }
+    
+    return render(request, 'accounts/hr/hr_bulk_mark_attendance.html', context)
+
+
+# Attendance heatmap - packed month bitmaps as JSON, one digit per day
+@login_required
+def hr_attendance_heatmap(request):
+    if request.subdomain=="localhost" or request.subdomain==settings.MAIN_SUBDOMAIN:
+        return HttpResponse("Sorry! You can only access by your enterprise subdomain")
+    
+    account = Account.objects.get(user=request.user)
+    
+    if account.role.upper() != "HR":
+        return HttpResponse("Access denied!")
+    
+    from attendance.models import STATUS_CODES
+    from attendance.services import accessible_employees, attendance_heatmap
+    
+    hr_profile = HRProfile.objects.get(account=account)
+    
+    try:
+        year = int(request.GET.get('year', date.today().year))
+    except ValueError:
+        year = None
+    if year is None or not MINYEAR <= year <= MAXYEAR:
+        return JsonResponse({'error': 'Invalid year'}, status=400)
+    
+    employees = accessible_employees(hr_profile).select_related('account__user', 'department')
+    if request.GET.get('department'):
+        try:
+            department_id = uuid.UUID(request.GET['department'])
+        except ValueError:
+            return JsonResponse({'error': 'Invalid department'}, status=400)
+        employees = employees.filter(department_id=department_id)
+    if request.GET.get('employee'):
+        try:
+            employee_id = int(request.GET['employee'])
+        except ValueError:
+            return JsonResponse({'error': 'Invalid employee'}, status=400)
+        employees = employees.filter(id=employee_id)
+    employees = list(employees.order_by('account__user__username'))
+    
+    heatmap = attendance_heatmap(employees, year)
+    return JsonResponse({
+        'year': year,
+        'codes': {code: status for status, code in STATUS_CODES.items()},
+        'employees': [
+            {
+                'id': emp.id,
+                'username': emp.account.user.username,
+                'department': emp.department.name if emp.department else None,
+                'months': heatmap.get(emp.id, {}),
+            }
+            for emp in employees
+        ],
+    })
+
+
 # Review requests - with department filtering
 @login_required
 def hr_review_requests(request):
@@ -157,14 +272,7 @@ def hr_review_requests(request):
             att_request.save()
             
             # Update or create the actual attendance record
-            Attendance.objects.update_or_create(
-                employee=att_request.employee,
-                date=att_request.date,
-                defaults={
-                    'status': att_request.requested_status,
-                    'marked_by': hr_profile
-                }
-            )
+            mark_attendance(hr_profile, att_request.employee, att_request.date, att_request.requested_status)
             
         elif action == 'reject':
             att_request.status = 'REJECTED'
@@ -215,6 +215,8 @@ class TenantSignupView(View):
                 owner=newUser,
                 subdomain=sub,
             )
+            # Lets this browser poll the provisioning status of its own tenant
+            request.session['signup_subdomain']=newTenantObj.subdomain
             if DEBUG:
                 tenant_url=f'http://localhost:8000/users/tenant_homepage/{newTenantObj.schema_name}'
             else:
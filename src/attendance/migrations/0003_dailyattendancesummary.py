@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_summary(apps, schema_editor):
+    Attendance = apps.get_model('attendance', 'Attendance')
+    DailyAttendanceSummary = apps.get_model('attendance', 'DailyAttendanceSummary')
+    rows = (
+        Attendance.objects.using(schema_editor.connection.alias)
+        .values('employee__department', 'date', 'status')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    DailyAttendanceSummary.objects.using(schema_editor.connection.alias).bulk_create(
+        [
+            DailyAttendanceSummary(
+                department_id=row['employee__department'], date=row['date'], status=row['status'], count=row['total']
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_account_approved_at_account_approved_by_and_more'),
+        ('attendance', '0002_alter_attendance_options_remove_attendance_tenant_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('PRESENT', 'Present'), ('ABSENT', 'Absent'), ('LEAVE', 'Leave')], max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='accounts.department')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'department'], name='attendance_summary_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('department', 'date', 'status'), name='attendance_daily_summary_unique', nulls_distinct=False)],
+            },
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
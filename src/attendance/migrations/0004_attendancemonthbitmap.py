@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BACKFILL_SQL = """
+    INSERT INTO attendance_attendancemonthbitmap (employee_id, month, bits)
+    SELECT
+        employee_id,
+        date_trunc('month', date)::date,
+        bit_or(
+            (CASE status WHEN 'PRESENT' THEN 1 WHEN 'ABSENT' THEN 2 WHEN 'LEAVE' THEN 3 ELSE 0 END)::bigint
+            << ((extract(day FROM date)::int - 1) * 2)
+        )
+    FROM attendance_attendance
+    GROUP BY 1, 2
+"""
+STATUS_CODES = {'PRESENT': 1, 'ABSENT': 2, 'LEAVE': 3}
+
+
+def backfill_bitmaps(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(BACKFILL_SQL)
+        return
+    Attendance = apps.get_model('attendance', 'Attendance')
+    AttendanceMonthBitmap = apps.get_model('attendance', 'AttendanceMonthBitmap')
+    bitmaps = {}
+    rows = Attendance.objects.using(connection.alias).values_list('employee_id', 'date', 'status').order_by()
+    for employee_id, day, status in rows.iterator():
+        key = (employee_id, day.replace(day=1))
+        bitmaps[key] = bitmaps.get(key, 0) | (STATUS_CODES.get(status, 0) << ((day.day - 1) * 2))
+    AttendanceMonthBitmap.objects.using(connection.alias).bulk_create(
+        [AttendanceMonthBitmap(employee_id=employee_id, month=month, bits=bits) for (employee_id, month), bits in bitmaps.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_account_approved_at_account_approved_by_and_more'),
+        ('attendance', '0003_dailyattendancesummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceMonthBitmap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('bits', models.BigIntegerField(default=0)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.employeeprofile')),
+            ],
+            options={
+                'unique_together': {('employee', 'month')},
+            },
+        ),
+        migrations.RunPython(backfill_bitmaps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:05
+
+from django.db import migrations
+
+
+def partition_attendance(apps, schema_editor):
+    from attendance.partitioning import convert_to_partitioned, partitioning_enabled
+
+    # Off by default; `attendance_partitions --convert` does it later
+    if not partitioning_enabled() or schema_editor.connection.vendor != 'postgresql':
+        return
+    convert_to_partitioned(using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0004_attendancemonthbitmap'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_attendance, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,6 @@
 from django.db import models
 from django.utils import timezone
-from accounts.models import EmployeeProfile, HRProfile
+from accounts.models import Department, EmployeeProfile, HRProfile
 import uuid
 
 STATUS_CHOICES = (
@@ -19,6 +19,9 @@ class Attendance(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
+        # With TENANT_ATTENDANCE_PARTITIONING the table is range partitioned
+        # by month on date (attendance.partitioning); its primary key is then
+        # (id, date) in the database, ids stay unique uuids
         unique_together = ("employee", "date")
         ordering = ['-date']
 
@@ -46,4 +49,59 @@ class AttendanceRequest(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.employee.account.user.username} - {self.date} - {self.status}"
\ No newline at end of file
+        return f"{self.employee.account.user.username} - {self.date} - {self.status}"
+
+class DailyAttendanceSummary(models.Model):
+    """
+    Attendance rows per (department, date, status), kept current by
+    attendance.services on every write so dashboards read a few rows
+    instead of counting Attendance. `rebuild_attendance_summary` recomputes it.
+    """
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, null=True, blank=True)
+    date = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # One row for "no department" too; needs Postgres 15+
+            models.UniqueConstraint(
+                fields=["department", "date", "status"],
+                name="attendance_daily_summary_unique",
+                nulls_distinct=False,
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["date", "department"], name="attendance_summary_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.department or '-'} - {self.date} - {self.status}: {self.count}"
+
+
+# 2-bit codes packed per day into AttendanceMonthBitmap.bits; 0 = not marked
+STATUS_CODES = {status: code for code, (status, _) in enumerate(STATUS_CHOICES, start=1)}
+CODE_STATUSES = {code: status for status, code in STATUS_CODES.items()}
+
+
+class AttendanceMonthBitmap(models.Model):
+    """
+    One employee's month of attendance packed into a bigint: day ``d`` is
+    the 2-bit STATUS_CODES value at bits ``(d-1)*2``. 31 days fit in 62
+    bits. Kept current by attendance.services next to Attendance writes.
+    """
+    employee = models.ForeignKey(EmployeeProfile, on_delete=models.CASCADE)
+    month = models.DateField(help_text="First day of the month")
+    bits = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("employee", "month")
+
+    def day_code(self, day):
+        return (self.bits >> ((day - 1) * 2)) & 3
+
+    def day_status(self, day):
+        return CODE_STATUSES.get(self.day_code(day))
+
+    def __str__(self):
+        return f"{self.employee.account.user.username} - {self.month:%Y-%m}"
@@ -0,0 +1,205 @@
+from datetime import date
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from helpers.db.catalog import reset_sequences, table_columns
+
+from .models import Attendance
+
+PARTITION_KEY = "date"
+
+RELKIND_SQL = "SELECT relkind FROM pg_catalog.pg_class WHERE oid = to_regclass(%s)"
+PARTITIONS_SQL = """
+    SELECT c.relname
+    FROM pg_catalog.pg_inherits i
+    JOIN pg_catalog.pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass(%s)
+"""
+CONSTRAINTS_SQL = """
+    SELECT con.conname, con.contype, pg_get_constraintdef(con.oid),
+           ARRAY(SELECT a.attname FROM pg_catalog.pg_attribute a
+                 WHERE a.attrelid = con.conrelid AND a.attnum = ANY(con.conkey))
+    FROM pg_catalog.pg_constraint con
+    WHERE con.conrelid = to_regclass(%s) AND con.contype IN ('p', 'u', 'f', 'x')
+"""
+IDENTITY_COLUMNS_SQL = """
+    SELECT a.attname FROM pg_catalog.pg_attribute a
+    WHERE a.attrelid = to_regclass(%s) AND a.attnum > 0 AND NOT a.attisdropped AND a.attidentity <> ''
+"""
+# Indexes that do not back a constraint; pg_get_indexdef qualifies the table
+INDEXES_SQL = """
+    SELECT pg_get_indexdef(i.indexrelid), i.indisunique,
+           ARRAY(SELECT a.attname FROM pg_catalog.pg_attribute a
+                 WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey))
+    FROM pg_catalog.pg_index i
+    WHERE i.indrelid = to_regclass(%s)
+      AND NOT EXISTS (SELECT 1 FROM pg_catalog.pg_constraint con WHERE con.conindid = i.indexrelid)
+"""
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def partitioning_enabled():
+    return getattr(settings, "TENANT_ATTENDANCE_PARTITIONING", False)
+
+
+def months_ahead():
+    return getattr(settings, "TENANT_ATTENDANCE_PARTITION_MONTHS_AHEAD", 3)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{Attendance._meta.db_table}_p{month:%Y%m}"
+
+
+def default_partition_name():
+    return f"{Attendance._meta.db_table}_default"
+
+
+def is_partitioned(cursor):
+    """True when the attendance table on the search_path is range partitioned"""
+    cursor.execute(RELKIND_SQL, [Attendance._meta.db_table])
+    row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def existing_partitions(cursor):
+    cursor.execute(PARTITIONS_SQL, [Attendance._meta.db_table])
+    return {row[0] for row in cursor.fetchall()}
+
+
+def create_month_partition(cursor, quote, month):
+    """
+    Partition for ``month``. Rows that already landed in the default
+    partition for that month are moved into it, since Postgres refuses to
+    create a partition whose range the default partition still holds: the
+    default is detached meanwhile, so the new partition is still created
+    from the parent and picks up its identity, keys and indexes.
+    """
+    table, default = quote(Attendance._meta.db_table), quote(default_partition_name())
+    name = quote(partition_name(month))
+    # Dates only ever come from date objects, safe to inline (DDL takes no parameters)
+    start, end = f"'{month.isoformat()}'", f"'{add_months(month, 1).isoformat()}'"
+    in_range = f"{quote(PARTITION_KEY)} >= {start} AND {quote(PARTITION_KEY)} < {end}"
+
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})")
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ({start}) TO ({end})")
+        return
+    cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {default}")
+    cursor.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ({start}) TO ({end})")
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {default} WHERE {in_range} RETURNING *) "
+        f"INSERT INTO {table} OVERRIDING SYSTEM VALUE SELECT * FROM moved"
+    )
+    cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT")
+
+
+def create_partitions(cursor, quote, first_month, last_month):
+    """Month partitions from ``first_month`` to ``last_month`` that don't exist yet; returns their names"""
+    existing = existing_partitions(cursor)
+    created = []
+    month = first_month
+    while month <= last_month:
+        if partition_name(month) not in existing:
+            create_month_partition(cursor, quote, month)
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def ensure_partitions(using=DEFAULT_DB_ALIAS, ahead=None, today=None):
+    """
+    Create this month's partition and ``ahead`` more on the active schema.
+    No-op (returns None) when the attendance table is not partitioned.
+    """
+    conn = connections[using]
+    ahead = months_ahead() if ahead is None else ahead
+    this_month = (today or date.today()).replace(day=1)
+    with transaction.atomic(using=using), conn.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return None
+        return create_partitions(cursor, conn.ops.quote_name, this_month, add_months(this_month, ahead))
+
+
+def convert_to_partitioned(using=DEFAULT_DB_ALIAS, ahead=None, today=None):
+    """
+    Rebuild the attendance table on the active schema as a table range
+    partitioned by month on ``date``, in one transaction.
+
+    A new parent is created next to the old table with its columns,
+    defaults, checks and identity columns, then gets a DEFAULT partition
+    plus one partition per month from the oldest row to ``ahead`` months
+    out. The rows are copied, the old table is dropped, and its keys,
+    foreign keys and indexes are replayed under their original names.
+    Identity columns get a fresh sequence moved past the copied rows,
+    serial sequences are handed to the new table. Postgres needs the
+    partition key in every unique constraint, so the primary key becomes
+    (id, date).
+    Returns False when there was nothing to do.
+    """
+    conn = connections[using]
+    quote = conn.ops.quote_name
+    db_table = Attendance._meta.db_table
+    old_table = f"{db_table}_unpartitioned"
+    ahead = months_ahead() if ahead is None else ahead
+    this_month = (today or date.today()).replace(day=1)
+
+    with transaction.atomic(using=using), conn.cursor() as cursor:
+        cursor.execute(RELKIND_SQL, [db_table])
+        row = cursor.fetchone()
+        if row is None or row[0] != "r":
+            return False
+        cursor.execute(f"LOCK TABLE {quote(db_table)} IN ACCESS EXCLUSIVE MODE")
+
+        cursor.execute(CONSTRAINTS_SQL, [db_table])
+        constraints = cursor.fetchall()
+        cursor.execute(INDEXES_SQL, [db_table])
+        indexes = cursor.fetchall()
+        cursor.execute(IDENTITY_COLUMNS_SQL, [db_table])
+        identity_columns = {row[0] for row in cursor.fetchall()}
+        for name, contype, _, columns in constraints:
+            if contype in ("u", "x") and PARTITION_KEY not in columns:
+                raise PartitioningError(f"Constraint {name} does not include '{PARTITION_KEY}'")
+        for definition, unique, columns in indexes:
+            if unique and PARTITION_KEY not in columns:
+                raise PartitioningError(f"Unique index does not include '{PARTITION_KEY}': {definition}")
+
+        cursor.execute("SELECT current_schema()")
+        schema_name = cursor.fetchone()[0]
+        cursor.execute(f"ALTER TABLE {quote(db_table)} RENAME TO {quote(old_table)}")
+        cursor.execute(
+            f"CREATE TABLE {quote(db_table)} (LIKE {quote(old_table)} "
+            f"INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY INCLUDING STORAGE INCLUDING COMMENTS) "
+            f"PARTITION BY RANGE ({quote(PARTITION_KEY)})"
+        )
+        # Serial sequences would go down with the old table; identity
+        # sequences can't change owner, the new table has its own
+        for column, sequence in table_columns(using, schema_name, old_table):
+            if sequence and column not in identity_columns:
+                cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {quote(db_table)}.{quote(column)}")
+
+        cursor.execute(f"CREATE TABLE {quote(default_partition_name())} PARTITION OF {quote(db_table)} DEFAULT")
+        cursor.execute(f"SELECT MIN({quote(PARTITION_KEY)}) FROM {quote(old_table)}")
+        oldest = cursor.fetchone()[0]
+        first_month = min(oldest.replace(day=1), this_month) if oldest else this_month
+        create_partitions(cursor, quote, first_month, add_months(this_month, ahead))
+
+        cursor.execute(f"INSERT INTO {quote(db_table)} OVERRIDING SYSTEM VALUE SELECT * FROM {quote(old_table)}")
+        cursor.execute(f"DROP TABLE {quote(old_table)}")
+        if identity_columns:
+            reset_sequences(cursor, using, schema_name, [db_table])
+
+        for name, contype, definition, columns in constraints:
+            if contype == "p" and PARTITION_KEY not in columns:
+                definition = f"PRIMARY KEY ({', '.join(quote(column) for column in [*columns, PARTITION_KEY])})"
+            cursor.execute(f"ALTER TABLE {quote(db_table)} ADD CONSTRAINT {quote(name)} {definition}")
+        for definition, _, _ in indexes:
+            cursor.execute(definition)
+    return True
@@ -0,0 +1,374 @@
+import calendar
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Q, Sum, Window
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from accounts.models import EmployeeProfile
+from .models import STATUS_CHOICES, STATUS_CODES, Attendance, AttendanceMonthBitmap, DailyAttendanceSummary
+
+STATUSES = [value for value, _ in STATUS_CHOICES]
+VALID_STATUSES = set(STATUSES)
+
+SUMMARY_UPSERT_SQL = """
+    INSERT INTO {table} (department_id, date, status, count)
+    VALUES {values}
+    ON CONFLICT (department_id, date, status)
+    DO UPDATE SET count = {table}.count + EXCLUDED.count
+"""
+
+BITMAP_UPSERT_SQL = """
+    INSERT INTO {table} (employee_id, month, bits)
+    VALUES {values}
+    ON CONFLICT (employee_id, month)
+    DO UPDATE SET bits = ({table}.bits & ~CAST(%s AS bigint)) | EXCLUDED.bits
+"""
+
+# Postgres only; other databases pack the bitmaps in Python
+BITMAP_REBUILD_SQL = """
+    INSERT INTO {table} (employee_id, month, bits)
+    SELECT
+        employee_id,
+        date_trunc('month', date)::date,
+        bit_or((CASE status {codes} ELSE 0 END)::bigint << ((extract(day FROM date)::int - 1) * 2))
+    FROM {attendance}
+    WHERE {where}
+    GROUP BY 1, 2
+"""
+
+
+def accessible_employees(hr_profile):
+    """Employees ``hr_profile`` may manage; same rules as HRProfile.has_access_to_employee"""
+    employees = EmployeeProfile.objects.all()
+    if hr_profile.is_admin or not hr_profile.departments.exists():
+        return employees
+    return employees.filter(Q(department__in=hr_profile.departments.all()) | Q(department__isnull=True))
+
+
+def clamp_summary_deltas(date, deltas, using):
+    """
+    Cap decrements at what DailyAttendanceSummary holds for ``date``. A
+    count would only go negative when the earlier mark was counted under
+    the employee's previous department; that is logged, the count stays
+    at zero and `rebuild_attendance_summary` moves it back where it belongs.
+    """
+    negative = [key for key, delta in deltas.items() if delta < 0]
+    if not negative:
+        return deltas
+    keys = Q()
+    for department_id, status in negative:
+        keys |= Q(department_id=department_id, status=status)
+    current = {
+        (row['department_id'], row['status']): row['total']
+        for row in DailyAttendanceSummary.objects.using(using)
+        .filter(keys, date=date)
+        .values('department_id', 'status')
+        .annotate(total=Sum('count'))
+        .order_by()
+    }
+    clamped = dict(deltas)
+    for key in negative:
+        total = current.get(key, 0)
+        if total + deltas[key] < 0:
+            print(
+                f"Attendance summary for department {key[0]} on {date} would drop to "
+                f"{total + deltas[key]} {key[1]}; clamped to 0, run rebuild_attendance_summary"
+            )
+            clamped[key] = -total
+    return clamped
+
+
+def apply_summary_deltas(date, deltas, using):
+    """
+    Add ``{(department_id, status): delta}`` to the DailyAttendanceSummary
+    rows of ``date``. One upsert where the database can enforce the
+    (department, date, status) key including NULL departments (Postgres
+    15+); elsewhere each delta is appended as a row of its own, readers
+    sum the counts either way.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if deltas:
+        deltas = {key: delta for key, delta in clamp_summary_deltas(date, deltas, using).items() if delta}
+    if not deltas:
+        return
+    conn = connections[using]
+    if not conn.features.supports_nulls_distinct_unique_constraints:
+        DailyAttendanceSummary.objects.using(using).bulk_create(
+            [
+                DailyAttendanceSummary(department_id=department_id, date=date, status=status, count=delta)
+                for (department_id, status), delta in deltas.items()
+            ]
+        )
+        return
+    values = ", ".join(["(%s, %s, %s, %s)"] * len(deltas))
+    params = []
+    for (department_id, status), delta in deltas.items():
+        params.extend([department_id, date, status, delta])
+    sql = SUMMARY_UPSERT_SQL.format(table=conn.ops.quote_name(DailyAttendanceSummary._meta.db_table), values=values)
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def apply_bitmap_codes(date, codes, using):
+    """Set ``date``'s 2-bit slot to ``{employee_id: code}`` in each month bitmap, one upsert"""
+    if not codes:
+        return
+    conn = connections[using]
+    shift = (date.day - 1) * 2
+    month = date.replace(day=1)
+    values = ", ".join(["(%s, %s, %s)"] * len(codes))
+    params = []
+    for employee_id, code in codes.items():
+        params.extend([employee_id, month, code << shift])
+    params.append(3 << shift)
+    sql = BITMAP_UPSERT_SQL.format(table=conn.ops.quote_name(AttendanceMonthBitmap._meta.db_table), values=values)
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def write_attendance(hr_profile, date, statuses):
+    """
+    Upsert ``{employee_id: status}`` for ``date`` and move the matching
+    DailyAttendanceSummary counts and AttendanceMonthBitmap slots, in one
+    transaction.
+
+    The employee rows are locked first (in id order) so two HRs marking the
+    same people can't both count the same change. Counts go to the
+    employee's current department; `rebuild_attendance_summary` fixes up
+    days recorded before someone changed department, until then
+    clamp_summary_deltas keeps the new department from going negative.
+    """
+    if isinstance(date, str):
+        date = parse_date(date)
+        if date is None:
+            raise ValueError("Invalid attendance date")
+    using = router.db_for_write(Attendance)
+    with transaction.atomic(using=using):
+        departments = dict(
+            EmployeeProfile.objects.select_for_update().filter(id__in=statuses).order_by('id').values_list('id', 'department_id')
+        )
+        previous = dict(
+            Attendance.objects.filter(date=date, employee_id__in=statuses).values_list('employee_id', 'status')
+        )
+
+        now = timezone.now()
+        rows = [
+            Attendance(employee_id=employee_id, date=date, status=status, marked_by=hr_profile, created_at=now)
+            for employee_id, status in statuses.items()
+        ]
+        Attendance.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["employee", "date"],
+            update_fields=["status", "marked_by", "updated_at"],
+        )
+
+        deltas, codes = Counter(), {}
+        for employee_id, status in statuses.items():
+            old_status = previous.get(employee_id)
+            if old_status == status:
+                continue
+            department_id = departments.get(employee_id)
+            if old_status:
+                deltas[(department_id, old_status)] -= 1
+            deltas[(department_id, status)] += 1
+            codes[employee_id] = STATUS_CODES[status]
+        apply_summary_deltas(date, deltas, using)
+        apply_bitmap_codes(date, codes, using)
+    return len(rows)
+
+
+def mark_attendance(hr_profile, employee, date, status):
+    """Single-employee write path (hr_mark_attendance, approved requests)"""
+    if status not in VALID_STATUSES:
+        raise ValueError(f"Unknown attendance status: {status}")
+    return write_attendance(hr_profile, date, {employee.id: status})
+
+
+def bulk_mark_attendance(hr_profile, date, statuses):
+    """
+    Mark ``{employee_id: status}`` for ``date`` in a single
+    INSERT ... ON CONFLICT (employee_id, date) DO UPDATE.
+
+    Access is checked once for the whole batch against the set of
+    accessible employee ids. Raises PermissionError / ValueError before
+    anything is written.
+    """
+    statuses = {int(employee_id): status for employee_id, status in statuses.items()}
+    invalid = {status for status in statuses.values() if status not in VALID_STATUSES}
+    if invalid:
+        raise ValueError(f"Unknown attendance status: {', '.join(sorted(invalid))}")
+    allowed = set(accessible_employees(hr_profile).filter(id__in=statuses).values_list('id', flat=True))
+    denied = statuses.keys() - allowed
+    if denied:
+        raise PermissionError(f"No access to {len(denied)} employee(s)")
+    return write_attendance(hr_profile, date, statuses)
+
+
+def attendance_stats(attendance):
+    """
+    Total, per-status counts and the day list of an Attendance queryset in
+    one query: the counts ride along on every row as
+    COUNT(*) FILTER (WHERE status = ...) OVER ().
+    """
+    windows = {f"n_{status.lower()}": Window(Count('id', filter=Q(status=status))) for status in STATUSES}
+    days = list(
+        attendance.order_by('date').values('date', 'status').annotate(n_total=Window(Count('id')), **windows)
+    )
+    first = days[0] if days else {}
+    return {
+        'total': first.get('n_total', 0),
+        'counts': {status: first.get(f"n_{status.lower()}", 0) for status in STATUSES},
+        'days': days,
+    }
+
+
+def employee_month_stats(employee, today=None):
+    """attendance_stats for ``employee`` from the 1st of the month up to ``today``"""
+    today = today or timezone.localdate()
+    stats = attendance_stats(
+        Attendance.objects.filter(employee=employee, date__gte=today.replace(day=1), date__lte=today)
+    )
+    total, present = stats['total'], stats['counts']['PRESENT']
+    stats['present_percentage'] = (present / total * 100) if total > 0 else 0
+    return stats
+
+
+def daily_summary_stats(date, departments=None):
+    """
+    Total and per-status counts for ``date`` from DailyAttendanceSummary,
+    one conditional aggregate. ``departments`` limits it to those
+    departments; None means everyone.
+    """
+    summary = DailyAttendanceSummary.objects.filter(date=date)
+    if departments is not None:
+        summary = summary.filter(department__in=departments)
+    sums = summary.aggregate(
+        n_total=Sum('count'),
+        **{f"n_{status.lower()}": Sum('count', filter=Q(status=status)) for status in STATUSES},
+    )
+    return {
+        'total': sums['n_total'] or 0,
+        'counts': {status: sums[f"n_{status.lower()}"] or 0 for status in STATUSES},
+    }
+
+
+def rebuild_daily_summary(start=None, end=None):
+    """
+    Recompute DailyAttendanceSummary from Attendance for ``start``..``end``
+    (inclusive, open ended when None). Attendance is share-locked meanwhile
+    so no mark lands between the delete and the re-insert.
+    """
+    using = router.db_for_write(Attendance)
+    attendance = Attendance.objects.all()
+    summary = DailyAttendanceSummary.objects.all()
+    if start is not None:
+        attendance, summary = attendance.filter(date__gte=start), summary.filter(date__gte=start)
+    if end is not None:
+        attendance, summary = attendance.filter(date__lte=end), summary.filter(date__lte=end)
+
+    with transaction.atomic(using=using):
+        lock_attendance(using)
+        summary.delete()
+        rows = (
+            attendance.values('employee__department', 'date', 'status')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        created = DailyAttendanceSummary.objects.bulk_create(
+            [
+                DailyAttendanceSummary(
+                    department_id=row['employee__department'], date=row['date'], status=row['status'], count=row['total']
+                )
+                for row in rows.iterator()
+            ],
+            batch_size=1000,
+        )
+    return len(created)
+
+
+def lock_attendance(using):
+    """Share-lock Attendance for the rest of the transaction (Postgres; SQLite writers are serialised anyway)"""
+    conn = connections[using]
+    if conn.vendor != 'postgresql':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {conn.ops.quote_name(Attendance._meta.db_table)} IN SHARE MODE")
+
+
+def pack_month_bitmaps(rows):
+    """{(employee_id, month): bits} from (employee_id, date, status) rows"""
+    bitmaps = Counter()
+    for employee_id, day, status in rows:
+        bitmaps[(employee_id, day.replace(day=1))] |= STATUS_CODES.get(status, 0) << ((day.day - 1) * 2)
+    return bitmaps
+
+
+def rebuild_month_bitmaps(start=None, end=None):
+    """
+    Recompute AttendanceMonthBitmap from Attendance for the whole months
+    covering ``start``..``end`` (open ended when None), same locking as
+    rebuild_daily_summary.
+    """
+    using = router.db_for_write(Attendance)
+    conn = connections[using]
+    quote = conn.ops.quote_name
+    attendance = Attendance.objects.all()
+    bitmaps = AttendanceMonthBitmap.objects.all()
+    where, params = ["TRUE"], []
+    if start is not None:
+        start = start.replace(day=1)
+        attendance, bitmaps = attendance.filter(date__gte=start), bitmaps.filter(month__gte=start)
+        where.append("date >= %s")
+        params.append(start)
+    if end is not None:
+        month_after = (end.replace(day=1) + timedelta(days=32)).replace(day=1)
+        attendance, bitmaps = attendance.filter(date__lt=month_after), bitmaps.filter(month__lte=end)
+        where.append("date < %s")
+        params.append(month_after)
+
+    with transaction.atomic(using=using):
+        lock_attendance(using)
+        bitmaps.delete()
+        if conn.vendor != 'postgresql':
+            packed = pack_month_bitmaps(attendance.values_list('employee_id', 'date', 'status').order_by().iterator())
+            created = AttendanceMonthBitmap.objects.bulk_create(
+                [AttendanceMonthBitmap(employee_id=employee_id, month=month, bits=bits) for (employee_id, month), bits in packed.items()],
+                batch_size=1000,
+            )
+            return len(created)
+        codes = " ".join(f"WHEN '{status}' THEN {code}" for status, code in STATUS_CODES.items())
+        sql = BITMAP_REBUILD_SQL.format(
+            table=quote(AttendanceMonthBitmap._meta.db_table),
+            attendance=quote(Attendance._meta.db_table),
+            codes=codes,
+            where=" AND ".join(where),
+        )
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+
+def decode_month(month, bits):
+    """One STATUS_CODES digit per day of ``month``, e.g. "1120..." (0 = not marked)"""
+    days = calendar.monthrange(month.year, month.month)[1]
+    return "".join(str((bits >> (day * 2)) & 3) for day in range(days))
+
+
+def attendance_heatmap(employees, year):
+    """
+    {employee_id: {"YYYY-MM": day digits}} for ``year``, read from the
+    packed month bitmaps: at most 12 small rows per employee. Months with
+    nothing marked are left out.
+    """
+    heatmap = {}
+    rows = AttendanceMonthBitmap.objects.filter(employee__in=employees, month__year=year).values_list(
+        'employee_id', 'month', 'bits'
+    )
+    for employee_id, month, bits in rows.order_by('month'):
+        heatmap.setdefault(employee_id, {})[f"{month:%Y-%m}"] = decode_month(month, bits)
+    return heatmap
+
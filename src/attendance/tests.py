@@ -1,3 +1,252 @@
+from datetime import date
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Sum
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import Account, Department, EmployeeProfile, HRProfile
+from .models import Attendance, AttendanceMonthBitmap, AttendanceRequest, DailyAttendanceSummary
+from .partitioning import convert_to_partitioned, default_partition_name, ensure_partitions, partition_name
+from .services import rebuild_daily_summary, write_attendance
+
+DAY = date(2025, 3, 14)
+
+
+def make_hr(username, is_admin=False):
+    # accounts.signals creates the profile along with the Account
+    user = User.objects.create_user(username=username, password="password")
+    hr = HRProfile.objects.get(account=Account.objects.create(user=user, role="HR"))
+    hr.is_admin = is_admin
+    hr.save()
+    return hr
+
+
+def make_employee(username, department=None):
+    user = User.objects.create_user(username=username, password="password")
+    employee = EmployeeProfile.objects.get(account=Account.objects.create(user=user, role="EMPLOYEE"))
+    employee.department = department
+    employee.save()
+    return employee
+
+
+class WriteAttendanceTestCase(TestCase):
+
+    def setUp(self):
+        self.department = Department.objects.create(name="Engineering")
+        self.hr = make_hr("hr", is_admin=True)
+        self.alice = make_employee("alice", self.department)
+        self.bob = make_employee("bob", self.department)
+
+    def summary(self):
+        rows = (
+            DailyAttendanceSummary.objects.filter(date=DAY)
+            .values('department_id', 'status')
+            .annotate(total=Sum('count'))
+            .order_by()
+        )
+        return {(row['department_id'], row['status']): row['total'] for row in rows if row['total']}
+
+    def assertMatchesRebuild(self, expected):
+        self.assertEqual(self.summary(), expected)
+        rebuild_daily_summary(DAY, DAY)
+        self.assertEqual(self.summary(), expected)
+
+    def day_status(self, employee):
+        bitmap = AttendanceMonthBitmap.objects.get(employee=employee, month=DAY.replace(day=1))
+        return bitmap.day_status(DAY.day)
+
+    def test_first_mark(self):
+        write_attendance(self.hr, DAY, {self.alice.id: "PRESENT", self.bob.id: "ABSENT"})
+        self.assertMatchesRebuild({
+            (self.department.id, "PRESENT"): 1,
+            (self.department.id, "ABSENT"): 1,
+        })
+        self.assertEqual(self.day_status(self.alice), "PRESENT")
+        self.assertEqual(self.day_status(self.bob), "ABSENT")
+
+    def test_same_status_is_not_counted_twice(self):
+        write_attendance(self.hr, DAY, {self.alice.id: "PRESENT"})
+        rows = DailyAttendanceSummary.objects.count()
+        write_attendance(self.hr, DAY.isoformat(), {self.alice.id: "PRESENT"})
+        self.assertEqual(DailyAttendanceSummary.objects.count(), rows)
+        self.assertMatchesRebuild({(self.department.id, "PRESENT"): 1})
+
+    def test_status_change_moves_the_count(self):
+        write_attendance(self.hr, DAY, {self.alice.id: "PRESENT", self.bob.id: "PRESENT"})
+        write_attendance(self.hr, DAY, {self.alice.id: "LEAVE"})
+        self.assertMatchesRebuild({
+            (self.department.id, "PRESENT"): 1,
+            (self.department.id, "LEAVE"): 1,
+        })
+        self.assertEqual(self.day_status(self.alice), "LEAVE")
+        self.assertEqual(self.day_status(self.bob), "PRESENT")
+
+    def test_department_change_does_not_go_negative(self):
+        write_attendance(self.hr, DAY, {self.alice.id: "PRESENT"})
+        sales = Department.objects.create(name="Sales")
+        self.alice.department = sales
+        self.alice.save()
+        write_attendance(self.hr, DAY, {self.alice.id: "ABSENT"})
+        self.assertEqual(self.summary(), {
+            (self.department.id, "PRESENT"): 1,
+            (sales.id, "ABSENT"): 1,
+        })
+        rebuild_daily_summary(DAY, DAY)
+        self.assertEqual(self.summary(), {(sales.id, "ABSENT"): 1})
+
+    def test_approved_request_is_counted(self):
+        write_attendance(self.hr, DAY, {self.alice.id: "ABSENT"})
+        request = AttendanceRequest.objects.create(
+            employee=self.alice, date=DAY, requested_status="PRESENT", reason="Was on site"
+        )
+        self.client.force_login(self.hr.account.user)
+        response = self.client.post("/users/hr/review_requests/", {"request_id": request.id, "action": "approve"})
+        self.assertEqual(response.status_code, 302)
+        request.refresh_from_db()
+        self.assertEqual(request.status, "APPROVED")
+        self.assertMatchesRebuild({(self.department.id, "PRESENT"): 1})
+        self.assertEqual(self.day_status(self.alice), "PRESENT")
+
+
+class BulkMarkAttendanceTestCase(TestCase):
+    url = "/users/hr/bulk_mark_attendance/"
+
+    def setUp(self):
+        self.department = Department.objects.create(name="Engineering")
+        self.other_department = Department.objects.create(name="Sales")
+        self.hr = make_hr("hr")
+        self.hr.departments.add(self.department)
+        self.alice = make_employee("alice", self.department)
+        self.carol = make_employee("carol", self.other_department)
+        self.client.force_login(self.hr.account.user)
+
+    def post(self, statuses):
+        data = {"date": DAY.isoformat()}
+        data.update({f"status_{employee.id}": status for employee, status in statuses.items()})
+        return self.client.post(self.url, data)
+
+    def test_no_access_to_employee(self):
+        response = self.post({self.alice: "PRESENT", self.carol: "PRESENT"})
+        self.assertContains(response, "Access denied")
+        self.assertFalse(Attendance.objects.exists())
+        self.assertFalse(DailyAttendanceSummary.objects.exists())
+
+    def test_unknown_status(self):
+        response = self.post({self.alice: "LATE"})
+        self.assertContains(response, "Invalid attendance data")
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_remark_existing_row(self):
+        self.post({self.alice: "PRESENT"})
+        response = self.post({self.alice: "ABSENT"})
+        self.assertRedirects(response, f"/users/hr/view_attendance/?date={DAY.isoformat()}", fetch_redirect_response=False)
+        self.assertEqual(list(Attendance.objects.values_list("employee_id", "status")), [(self.alice.id, "ABSENT")])
+        summary = DailyAttendanceSummary.objects.filter(date=DAY).values("status").annotate(total=Sum("count"))
+        self.assertEqual({row["status"]: row["total"] for row in summary if row["total"]}, {"ABSENT": 1})
+
+    def test_missing_or_invalid_post_date(self):
+        for data in ({}, {"date": ""}, {"date": "garbage"}, {"date": "2025-02-30"}):
+            data[f"status_{self.alice.id}"] = "PRESENT"
+            self.assertEqual(self.client.post(self.url, data).status_code, 400)
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_invalid_date(self):
+        self.assertEqual(self.client.get(self.url, {"date": "garbage"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"date": "2025-02-30"}).status_code, 400)
+        response = self.client.get(self.url, {"date": DAY.isoformat()})
+        self.assertEqual(response.context["selected_date"], DAY.isoformat())
+
+
+class AttendanceHeatmapTestCase(TestCase):
+    url = "/users/hr/attendance_heatmap/"
+
+    def setUp(self):
+        self.department = Department.objects.create(name="Engineering")
+        self.hr = make_hr("hr", is_admin=True)
+        self.alice = make_employee("alice", self.department)
+        self.bob = make_employee("bob")
+        write_attendance(self.hr, DAY, {self.alice.id: "PRESENT", self.bob.id: "LEAVE"})
+        self.client.force_login(self.hr.account.user)
+
+    def test_filters(self):
+        response = self.client.get(self.url, {"year": DAY.year, "department": str(self.department.id)})
+        self.assertEqual(response.status_code, 200)
+        employees = response.json()["employees"]
+        self.assertEqual([employee["id"] for employee in employees], [self.alice.id])
+        self.assertEqual(employees[0]["months"]["2025-03"][DAY.day - 1], "1")
+
+        response = self.client.get(self.url, {"year": DAY.year, "employee": self.bob.id})
+        self.assertEqual([employee["id"] for employee in response.json()["employees"]], [self.bob.id])
+
+    def test_invalid_params(self):
+        for params in (
+            {"year": "garbage"},
+            {"year": "99999"},
+            {"year": "0"},
+            {"department": "not-a-uuid"},
+            {"employee": "x"},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+@skipUnless(connection.vendor == "postgresql", "Partitioning needs Postgres")
+class ConvertToPartitionedTestCase(TestCase):
+
+    def setUp(self):
+        self.hr = make_hr("hr", is_admin=True)
+        self.alice = make_employee("alice")
+        write_attendance(self.hr, date(2025, 1, 10), {self.alice.id: "PRESENT"})
+        write_attendance(self.hr, DAY, {self.alice.id: "ABSENT"})
+        # Attendance ids are uuids; an identity column checks the sequence
+        # survives the rebuild
+        self.flush_constraints()
+        self.sql("ALTER TABLE attendance_attendance ADD COLUMN seq bigint GENERATED BY DEFAULT AS IDENTITY")
+
+    def sql(self, query, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall() if cursor.description else None
+
+    def flush_constraints(self):
+        # Everything runs in the test's transaction; deferred foreign key
+        # checks left pending would block ALTER TABLE
+        self.sql("SET CONSTRAINTS ALL IMMEDIATE")
+
+    def partition_of(self, day):
+        return self.sql(
+            "SELECT tableoid::regclass::text FROM attendance_attendance WHERE employee_id = %s AND date = %s",
+            [self.alice.id, day],
+        )[0][0]
+
+    def test_convert(self):
+        self.assertTrue(convert_to_partitioned(ahead=1, today=DAY))
+        self.assertFalse(convert_to_partitioned(ahead=1, today=DAY))
+
+        self.assertEqual(self.sql("SELECT relkind FROM pg_class WHERE oid = 'attendance_attendance'::regclass"), [("p",)])
+        self.assertEqual(
+            sorted(Attendance.objects.values_list("date", "status")),
+            [(date(2025, 1, 10), "PRESENT"), (DAY, "ABSENT")],
+        )
+        self.assertEqual(self.partition_of(DAY), partition_name(DAY.replace(day=1)))
+        self.assertEqual(
+            self.sql("SELECT attidentity FROM pg_attribute WHERE attrelid = 'attendance_attendance'::regclass AND attname = 'seq'"),
+            [("d",)],
+        )
+
+        write_attendance(self.hr, date(2025, 4, 1), {self.alice.id: "LEAVE"})
+        self.assertEqual(self.sql("SELECT max(seq) FROM attendance_attendance"), [(3,)])
+
+    def test_partition_for_rows_in_default(self):
+        convert_to_partitioned(ahead=0, today=DAY)
+        later = date(2025, 6, 2)
+        write_attendance(self.hr, later, {self.alice.id: "PRESENT"})
+        self.assertEqual(self.partition_of(later), default_partition_name())
+
+        self.flush_constraints()
+        self.assertEqual(ensure_partitions(ahead=0, today=later), [partition_name(later.replace(day=1))])
+        self.assertEqual(self.partition_of(later), partition_name(later.replace(day=1)))
+        write_attendance(self.hr, date(2025, 6, 3), {self.alice.id: "PRESENT"})
+        self.assertEqual(self.sql("SELECT count(DISTINCT seq) FROM attendance_attendance"), [(4,)])
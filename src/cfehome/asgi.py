@@ -3,6 +3,10 @@ ASGI config for cfehome project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+SchemaTenantMiddleware is async-capable and keeps the tenant schema in a
+context variable, so the app can be served by an ASGI server, e.g.
+``gunicorn cfehome.asgi:application -k uvicorn.workers.UvicornWorker``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -4,7 +4,7 @@ Production-ready (Railway)
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 from .installed import (
     _INSTALLED_APPS,
     _CUSTOMER_INSTALLED_APPS
@@ -95,6 +95,20 @@ WSGI_APPLICATION = "cfehome.wsgi.application"
 DATABASE_URL = config("DATABASE_URL", default=None)
 CONN_MAX_AGE = config("CONN_MAX_AGE", cast=int, default=300)
 
+# psycopg3 connection pool (helpers.db.engine). Connections are checked out
+# per request and returned on close, so CONN_MAX_AGE must be 0 when enabled.
+DB_POOL = config("DB_POOL", cast=bool, default=False)
+DB_POOL_MIN_SIZE = config("DB_POOL_MIN_SIZE", cast=int, default=2)
+DB_POOL_MAX_SIZE = config("DB_POOL_MAX_SIZE", cast=int, default=10)
+DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", cast=float, default=10)
+
+# How long a tenant search_path sticks:
+#   "session"     - SET search_path per connection (direct or session pooling)
+#   "transaction" - SET LOCAL per transaction, every request runs in one
+#                   (PgBouncer pool_mode=transaction). Run migrations and other
+#                   management commands over a direct connection.
+TENANT_SCHEMA_SCOPE = config("TENANT_SCHEMA_SCOPE", default="session")
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
@@ -102,17 +116,43 @@ DATABASES = {
     }
 }
 
+# Extra Postgres databases tenant schemas can be placed on, as a comma
+# separated list of alias=url pairs, e.g. "shard1=postgres://...,shard2=..."
+TENANT_SHARD_URLS = config("TENANT_SHARD_URLS", default="", cast=Csv())
+
 if DATABASE_URL:
     import dj_database_url
-    DATABASES = {
-        "default": dj_database_url.config(
-            default=DATABASE_URL,
-            conn_max_age=CONN_MAX_AGE,
+
+    def postgres_database(url):
+        database = dj_database_url.parse(
+            url,
+            conn_max_age=0 if DB_POOL else CONN_MAX_AGE,
             conn_health_checks=True,
             ssl_require=True,
             engine="helpers.db.engine",
         )
+        if TENANT_SCHEMA_SCOPE == "transaction":
+            # Server-side cursors don't survive transaction pooling either.
+            database["DISABLE_SERVER_SIDE_CURSORS"] = True
+        if DB_POOL:
+            database.setdefault("OPTIONS", {})["pool"] = {
+                "min_size": DB_POOL_MIN_SIZE,
+                "max_size": DB_POOL_MAX_SIZE,
+                "timeout": DB_POOL_TIMEOUT,
+            }
+        return database
+
+    DATABASES = {
+        "default": postgres_database(DATABASE_URL),
     }
+    for shard in TENANT_SHARD_URLS:
+        shard_alias, shard_url = shard.split("=", 1)
+        DATABASES[shard_alias.strip()] = postgres_database(shard_url.strip())
+
+DATABASE_ROUTERS = ["helpers.db.routers.TenantShardRouter"]
+
+# Shards new tenants are spread over (fewest tenants first)
+TENANT_PLACEMENT_SHARDS = config("TENANT_PLACEMENT_SHARDS", default=",".join(DATABASES), cast=Csv())
 
 # --------------------------------------------------
 # REDIS (OPTIONAL)
@@ -131,6 +171,70 @@ if REDIS_CACHE_URL:
         }
     }
 
+# --------------------------------------------------
+# MULTI-TENANCY
+# --------------------------------------------------
+
+# Subdomain -> tenant resolution: in-process LRU (L1) in front of CACHES (L2)
+TENANT_RESOLVER_L1_SIZE = config("TENANT_RESOLVER_L1_SIZE", cast=int, default=2048)
+TENANT_RESOLVER_L1_TTL = config("TENANT_RESOLVER_L1_TTL", cast=int, default=60)
+TENANT_RESOLVER_CACHE_TTL = config("TENANT_RESOLVER_CACHE_TTL", cast=int, default=600)
+# Unknown subdomains are remembered this long before Postgres is asked again
+TENANT_RESOLVER_MISS_TTL = config("TENANT_RESOLVER_MISS_TTL", cast=int, default=30)
+# The in-process copy can't be evicted by other workers, keep it short
+TENANT_RESOLVER_L1_MISS_TTL = config("TENANT_RESOLVER_L1_MISS_TTL", cast=int, default=5)
+# The Bloom filter version key must be shared between workers, so only
+# enable it by default when Redis backs the cache; it stays off with a
+# per-process (locmem) or dummy cache whatever this says
+TENANT_RESOLVER_BLOOM = config("TENANT_RESOLVER_BLOOM", cast=bool, default=bool(REDIS_CACHE_URL))
+TENANT_RESOLVER_BLOOM_FP_RATE = config("TENANT_RESOLVER_BLOOM_FP_RATE", cast=float, default=0.01)
+
+# Seconds a process trusts its cached list of schema names; schemas dropped
+# or renamed by another process are seen after at most this long
+TENANT_SCHEMA_REGISTRY_TTL = config("TENANT_SCHEMA_REGISTRY_TTL", cast=int, default=30)
+
+# "migrate" runs every customer migration for a new tenant; "clone" copies a
+# fully migrated template schema instead (constant-time signup)
+TENANT_PROVISIONING_MODE = config("TENANT_PROVISIONING_MODE", default="migrate")
+TENANT_TEMPLATE_SCHEMA = config("TENANT_TEMPLATE_SCHEMA", default="tenant_template")
+# New tenants are provisioned by the `provision_tenants --interval N` worker:
+# the Docker image starts one next to gunicorn (TENANT_PROVISION_WORKER=false
+# turns it off when a separate worker service runs it), the Procfile declares
+# it as `worker`. Turn on to use a background thread of the web process
+# instead, e.g. with runserver and no worker
+TENANT_PROVISION_IN_PROCESS = config("TENANT_PROVISION_IN_PROCESS", cast=bool, default=False)
+# Pre-provisioned schemas kept per shard for signups to claim (0 disables);
+# refilled by `python manage.py fill_schema_pool`
+TENANT_SCHEMA_POOL_SIZE = config("TENANT_SCHEMA_POOL_SIZE", cast=int, default=0)
+
+# Migrate each tenant schema on its first request after a deploy instead of
+# all of them up front (dormant tenants never pay). Not with
+# TENANT_SCHEMA_SCOPE = "transaction": run `migrate_schema` over a direct
+# connection instead
+TENANT_LAZY_MIGRATE = config("TENANT_LAZY_MIGRATE", cast=bool, default=False)
+
+# `migrate_schema --rollout`: canary tenants first, then growing batches that
+# stop when a tenant is too slow or too many fail
+TENANT_CANARY_SUBDOMAINS = config("TENANT_CANARY_SUBDOMAINS", default="", cast=Csv())
+TENANT_CANARY_PERCENT = config("TENANT_CANARY_PERCENT", cast=float, default=1.0)
+TENANT_ROLLOUT_FIRST_BATCH = config("TENANT_ROLLOUT_FIRST_BATCH", cast=int, default=10)
+TENANT_ROLLOUT_GROWTH = config("TENANT_ROLLOUT_GROWTH", cast=float, default=2.0)
+TENANT_ROLLOUT_MAX_BATCH = config("TENANT_ROLLOUT_MAX_BATCH", cast=int, default=500)
+TENANT_ROLLOUT_PAUSE = config("TENANT_ROLLOUT_PAUSE", cast=int, default=30)
+TENANT_ROLLOUT_MAX_SECONDS = config("TENANT_ROLLOUT_MAX_SECONDS", cast=float, default=120.0)
+TENANT_ROLLOUT_MAX_ERROR_RATE = config("TENANT_ROLLOUT_MAX_ERROR_RATE", cast=float, default=0.05)
+
+# Range-partition each tenant's attendance table by month (Postgres). Applied
+# by attendance migration 0005; tenants migrated before it was on are
+# converted with `attendance_partitions --convert`. Run `attendance_partitions`
+# daily so the months ahead exist before rows arrive (others land in the
+# default partition and are moved out when their month is created)
+TENANT_ATTENDANCE_PARTITIONING = config("TENANT_ATTENDANCE_PARTITIONING", cast=bool, default=False)
+TENANT_ATTENDANCE_PARTITION_MONTHS_AHEAD = config("TENANT_ATTENDANCE_PARTITION_MONTHS_AHEAD", cast=int, default=3)
+
+# Ask the server for current_schema() at request end (debug aid, one extra query)
+TENANT_VERIFY_SEARCH_PATH = config("TENANT_VERIFY_SEARCH_PATH", cast=bool, default=False)
+
 # --------------------------------------------------
 # AUTH / ALLAUTH
 # --------------------------------------------------
@@ -16,11 +16,14 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from .views import LandingPageView
+from .views import LandingPageView, db_stats_view, readiness_view, tenant_migration_status_view
 urlpatterns = [
     path('', LandingPageView ,name='landingpage'),
     path('users/', include('accounts.urls')),
     path('users/', include('allauth.urls')),
     path('tenants/', include('tenants.urls')),
     path("admin/", admin.site.urls),
+    path("health/db/", db_stats_view, name='db-stats'),
+    path("health/migrations/", tenant_migration_status_view, name='tenant-migration-status'),
+    path("health/ready/", readiness_view, name='readiness'),
 ]
@@ -4,7 +4,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.conf import settings
 
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 
 LOGIN_URL = settings.LOGIN_URL
 
@@ -19,3 +19,58 @@ def LandingPageView(request):
             is_main_domain=True
     context = { 'is_main_domain': is_main_domain, 'subdomain': request.subdomain }
     return render(request, 'accounts/landing_page.html', context)
+
+
+@staff_member_required
+def db_stats_view(request):
+    """Connection pool and search_path counters for this worker"""
+    from django.db import connections
+    stats = {}
+    for conn in connections.all(initialized_only=True):
+        stats[conn.alias] = {
+            'schema': getattr(conn, 'schema_stats', None),
+            'pool': conn.pool_stats() if hasattr(conn, 'pool_stats') else None,
+        }
+    return JsonResponse(stats)
+
+
+@staff_member_required
+def tenant_migration_status_view(request):
+    """Tenants whose schema is behind the code (?all=1 lists every tenant)"""
+    from tenants.status import tenant_migration_status
+    rows = tenant_migration_status()
+    behind = [row for row in rows if not row['up_to_date']]
+    return JsonResponse({
+        'tenants': len(rows),
+        'behind': len(behind),
+        'results': rows if request.GET.get('all') else behind,
+    })
+
+
+def readiness_view(request):
+    """
+    Deploy/readiness probe: 200 once public is at the code's migrations
+    (when migrate_on_start has recorded it), 503 before that or when the
+    database can't answer. Probes only get ``ready``; staff also see how
+    many tenants lag behind.
+    """
+    from django.db import DatabaseError
+    from helpers.db.schemas import use_public_schema
+    from tenants.fingerprints import code_fingerprint, fingerprint_table_ready, get_stored_fingerprint, outdated_tenants
+    is_staff = request.user.is_authenticated and request.user.is_staff
+    details = {}
+    try:
+        with use_public_schema():
+            # Missing until tenants' migrations ran on this deploy
+            public_current = fingerprint_table_ready()
+            if public_current:
+                public = get_stored_fingerprint('public')
+                public_current = public is None or public == code_fingerprint()
+            if public_current and is_staff:
+                details['tenants_behind'] = outdated_tenants().count()
+    except DatabaseError as e:
+        print(f"[ERROR] readiness_view: {e}")
+        public_current = False
+    if is_staff:
+        details['public_current'] = public_current
+    return JsonResponse({'ready': public_current, **details}, status=200 if public_current else 503)
@@ -0,0 +1,43 @@
+from typing import Any
+from django.core.management import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from helpers.db.schemas import use_public_schema, use_tenant_schema
+from tenants.models import Tenants
+from attendance.partitioning import PartitioningError, convert_to_partitioned, ensure_partitions, months_ahead
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly attendance partitions per tenant (run daily); --convert partitions existing tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", action="append", default=[], help="Subdomain (repeatable); default every ready tenant")
+        parser.add_argument("--months-ahead", type=int, default=None, help=f"Months past the current one (default {months_ahead()})")
+        parser.add_argument("--convert", action="store_true", help="Convert tenants whose attendance table is not partitioned yet")
+
+    def handle(self, *args: Any, **options: Any):
+        with use_public_schema():
+            tenants = Tenants.objects.filter(provisioning_status="READY").order_by("subdomain")
+            if options["tenant"]:
+                tenants = tenants.filter(subdomain__in=options["tenant"])
+            tenants = list(tenants)
+        if not tenants:
+            raise CommandError("No matching tenants")
+        failed = 0
+        for tenant in tenants:
+            using = tenant.db_alias or DEFAULT_DB_ALIAS
+            try:
+                with use_tenant_schema(tenant.schema_name, create_if_missing=False, using=using):
+                    if options["convert"] and convert_to_partitioned(using, ahead=options["months_ahead"]):
+                        self.stdout.write(f"{tenant.subdomain}: converted to monthly partitions")
+                        continue
+                    created = ensure_partitions(using, ahead=options["months_ahead"])
+            except PartitioningError as e:
+                failed += 1
+                self.stderr.write(f"{tenant.subdomain}: {e}")
+                continue
+            if created is None:
+                self.stdout.write(f"{tenant.subdomain}: not partitioned, skipped")
+            else:
+                self.stdout.write(f"{tenant.subdomain}: {len(created)} partition(s) created")
+        if failed:
+            raise CommandError(f"{failed} tenant(s) failed")
+        self.stdout.write(self.style.SUCCESS(f"Checked {len(tenants)} tenant(s)"))
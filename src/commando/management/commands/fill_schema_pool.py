@@ -0,0 +1,24 @@
+import time
+from typing import Any
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.core.management import BaseCommand
+from tenants.pool import fill_schema_pool, schema_pool_size
+
+class Command(BaseCommand):
+    help = "Keep TENANT_SCHEMA_POOL_SIZE pre-migrated schemas ready on every shard"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=None)
+        parser.add_argument("--interval", type=int, default=0, help="Keep running, refilling every N seconds")
+
+    def handle(self, *args: Any, **options: Any):
+        size = options["size"] if options["size"] is not None else schema_pool_size()
+        while True:
+            for using in getattr(settings, "TENANT_PLACEMENT_SHARDS", None) or [DEFAULT_DB_ALIAS]:
+                built = fill_schema_pool(using, size)
+                if built:
+                    self.stdout.write(f"Built {built} pooled schema(s) on {using}")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
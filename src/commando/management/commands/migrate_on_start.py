@@ -0,0 +1,37 @@
+from typing import Any
+from django.core.management import BaseCommand, call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from helpers.db.locks import advisory_lock
+from helpers.db.schemas import use_public_schema
+from tenants.fingerprints import code_fingerprint, fingerprint_table_ready, get_stored_fingerprint, schema_fingerprint, store_fingerprint
+
+LOCK_NAME = "migrate-on-start"
+
+class Command(BaseCommand):
+    help = "Container start: one replica migrates under an advisory lock, none do when nothing changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--no-wait", action="store_true", help="Skip instead of waiting while another replica migrates")
+        parser.add_argument("--tenants", action="store_true", help="Also run migrate_schema for tenants behind")
+
+    def is_current(self):
+        return fingerprint_table_ready() and get_stored_fingerprint("public") == code_fingerprint()
+
+    def handle(self, *args: Any, **options: Any):
+        if self.is_current():
+            self.stdout.write("Migrations unchanged, skipping migrate")
+            return
+        with advisory_lock(LOCK_NAME, wait=not options["no_wait"]) as acquired:
+            if not acquired:
+                self.stdout.write("Another replica is migrating, skipping")
+                return
+            # Whoever held the lock before us may have done the work already
+            if self.is_current():
+                self.stdout.write("Migrated by another replica")
+                return
+            call_command("migrate", interactive=False)
+            if options["tenants"]:
+                call_command("migrate_schema", stdout=self.stdout)
+            with use_public_schema():
+                store_fingerprint("public", schema_fingerprint(connections[DEFAULT_DB_ALIAS]))
+        self.stdout.write(self.style.SUCCESS("Migrations applied"))
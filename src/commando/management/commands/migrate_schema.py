@@ -1,8 +1,45 @@
 from typing import Any
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError, call_command
+from tenants.provisioning import provisioning_mode
+from tenants.rollout import RolloutPolicy
 from tenants.tasks import migrate_all_tenant_schema_task
 
 class Command(BaseCommand):
 
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", type=int, default=1, help="Tenants migrated in parallel (one process each)")
+        parser.add_argument("--force", action="store_true", help="Also visit tenants that look up to date")
+        parser.add_argument("--resume", metavar="RUN_ID", default=None, help="Retry only failed/unvisited tenants of a previous run")
+        parser.add_argument("--rollout", action="store_true", help="Canary first, then growing batches (TENANT_ROLLOUT_* settings)")
+        parser.add_argument("--canary-percent", type=float, default=None)
+        parser.add_argument("--first-batch", type=int, default=None)
+        parser.add_argument("--pause", type=int, default=None, help="Seconds between rollout batches")
+        parser.add_argument("--max-seconds", type=float, default=None, help="Halt when a tenant takes longer than this")
+        parser.add_argument("--max-error-rate", type=float, default=None, help="Halt when a batch fails more than this fraction")
+
     def handle(self, *args: Any, **options: Any):
-        migrate_all_tenant_schema_task()
\ No newline at end of file
+        rollout = None
+        if options["rollout"]:
+            rollout = RolloutPolicy.from_settings(
+                canary_percent=options["canary_percent"],
+                first_batch=options["first_batch"],
+                pause=options["pause"],
+                max_seconds=options["max_seconds"],
+                max_error_rate=options["max_error_rate"],
+            )
+        summary = migrate_all_tenant_schema_task(
+            jobs=options["jobs"],
+            report=self.stdout.write,
+            force=options["force"],
+            resume=options["resume"],
+            rollout=rollout,
+        )
+        if provisioning_mode() == "clone":
+            # New tenants should be cloned from a schema that is already current
+            call_command("refresh_tenant_template", stdout=self.stdout)
+        if summary["halted"]:
+            raise CommandError(f"Rollout halted ({summary['halted']}), continue with --resume {summary['run_id']}")
+        if summary["failed"]:
+            for tenant_id, error in summary["failed"]:
+                self.stderr.write(f"  {tenant_id}: {error}")
+            raise CommandError(f"{len(summary['failed'])} tenant migration(s) failed, rerun with --resume {summary['run_id']}")
@@ -0,0 +1,34 @@
+import time
+from datetime import timedelta
+from typing import Any
+from django.apps import apps
+from django.core.management import BaseCommand
+from helpers.db.schemas import use_public_schema
+from tenants.provisioning import provision_tenant, requeue_outdated_tenants, requeue_stale_provisioning
+
+class Command(BaseCommand):
+    help = "Provision PENDING tenants (background worker for signup)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=int, default=0, help="Keep running, polling every N seconds")
+        parser.add_argument("--stale", type=int, default=900, help="Requeue PROVISIONING rows this old whose worker is gone (its lock is free)")
+        parser.add_argument("--check-outdated", action="store_true", help="Also requeue READY tenants whose schema is behind")
+
+    def handle(self, *args: Any, **options: Any):
+        Tenants = apps.get_model('tenants', 'Tenants')
+        while True:
+            requeued = requeue_stale_provisioning(timedelta(seconds=options["stale"]))
+            if options["check_outdated"]:
+                requeued += requeue_outdated_tenants()
+            if requeued:
+                self.stdout.write(f"Requeued {requeued} tenant(s)")
+            with use_public_schema():
+                pending = list(Tenants.objects.filter(provisioning_status="PENDING").order_by("timestamp").values_list("id", flat=True))
+            for tenant_id in pending:
+                if provision_tenant(tenant_id):
+                    self.stdout.write(f"Provisioned {tenant_id}")
+                else:
+                    self.stderr.write(f"Skipped or failed {tenant_id}")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,30 @@
+from datetime import date
+from typing import Any
+from django.core.management import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from helpers.db.schemas import use_public_schema, use_tenant_schema
+from tenants.models import Tenants
+from attendance.services import rebuild_daily_summary, rebuild_month_bitmaps
+
+class Command(BaseCommand):
+    help = "Recompute DailyAttendanceSummary and AttendanceMonthBitmap from Attendance, per tenant"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", action="append", default=[], help="Subdomain to rebuild (repeatable); default every ready tenant")
+        parser.add_argument("--start", type=date.fromisoformat, help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--end", type=date.fromisoformat, help="Last day to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args: Any, **options: Any):
+        with use_public_schema():
+            tenants = Tenants.objects.filter(provisioning_status="READY").order_by("subdomain")
+            if options["tenant"]:
+                tenants = tenants.filter(subdomain__in=options["tenant"])
+            tenants = list(tenants)
+        if not tenants:
+            raise CommandError("No matching tenants")
+        for tenant in tenants:
+            with use_tenant_schema(tenant.schema_name, create_if_missing=False, using=tenant.db_alias or DEFAULT_DB_ALIAS):
+                rows = rebuild_daily_summary(options["start"], options["end"])
+                bitmaps = rebuild_month_bitmaps(options["start"], options["end"])
+            self.stdout.write(f"{tenant.subdomain}: {rows} summary rows, {bitmaps} month bitmaps")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(tenants)} tenant(s)"))
@@ -0,0 +1,13 @@
+from typing import Any
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.core.management import BaseCommand
+from tenants.provisioning import ensure_template_schema, template_schema_name
+
+class Command(BaseCommand):
+    help = "Create or migrate the template schema new tenants are cloned from"
+
+    def handle(self, *args: Any, **options: Any):
+        for using in getattr(settings, "TENANT_PLACEMENT_SHARDS", None) or [DEFAULT_DB_ALIAS]:
+            ensure_template_schema(using)
+            self.stdout.write(f"{template_schema_name()} is current on {using}")
@@ -0,0 +1,28 @@
+import json
+from typing import Any
+from django.core.management import BaseCommand
+from tenants.status import tenant_migration_status
+
+class Command(BaseCommand):
+    help = "List tenant schemas that are behind the code's migrations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true")
+        parser.add_argument("--all", action="store_true", help="Include up to date tenants")
+        parser.add_argument("--scan", action="store_true", help="Ignore stored fingerprints, read every django_migrations")
+
+    def handle(self, *args: Any, **options: Any):
+        rows = tenant_migration_status(trust_fingerprints=not options["scan"])
+        behind = [row for row in rows if not row["up_to_date"]]
+        shown = rows if options["all"] else behind
+        if options["json"]:
+            self.stdout.write(json.dumps(shown, indent=2))
+            return
+        for row in shown:
+            state = "up to date" if row["up_to_date"] else f"{len(row['pending'])} pending"
+            if not row["initialized"]:
+                state = "not initialized"
+            self.stdout.write(f"{row['subdomain']:<30} {row['db_alias']:<12} {state}")
+            for name in row["pending"]:
+                self.stdout.write(f"    {name}")
+        self.stdout.write(f"{len(behind)} of {len(rows)} tenants behind")
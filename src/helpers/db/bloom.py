@@ -0,0 +1,40 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Compact set-membership filter: no false negatives, tunable false positives.
+
+    Bit positions come from double hashing one blake2b digest, so a lookup
+    costs a single hash regardless of how many probes are used.
+    """
+
+    def __init__(self, size, hashes):
+        self.size = max(int(size), 8)
+        self.hashes = max(int(hashes), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    @classmethod
+    def from_items(cls, items, fp_rate=0.01):
+        items = list(items)
+        n = max(len(items), 1)
+        size = math.ceil(-n * math.log(fp_rate) / (math.log(2) ** 2))
+        hashes = round(size / n * math.log(2))
+        bloom = cls(size, hashes)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
@@ -0,0 +1,54 @@
+from django.db import connections
+
+SCHEMA_TABLES_SQL = """
+    SELECT c.relname
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = %s AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+    ORDER BY c.relname
+"""
+TABLE_COLUMNS_SQL = """
+    SELECT a.attname, pg_get_serial_sequence(%s, a.attname)
+    FROM pg_catalog.pg_attribute a
+    WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped AND a.attgenerated = ''
+    ORDER BY a.attnum
+"""
+
+
+def raw_connection(using):
+    """The psycopg connection behind a Django alias"""
+    connections[using].ensure_connection()
+    return connections[using].connection
+
+
+def qualified_name(using, schema_name, table):
+    quote = connections[using].ops.quote_name
+    return f"{quote(schema_name)}.{quote(table)}"
+
+
+def list_schema_tables(using, schema_name):
+    """Top-level tables of ``schema_name`` (partitions are reached through their parent)"""
+    with raw_connection(using).cursor() as cursor:
+        cursor.execute(SCHEMA_TABLES_SQL, [schema_name])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def table_columns(using, schema_name, table):
+    """[(column, owned sequence or None)] in attribute order, generated columns left out"""
+    qualified = qualified_name(using, schema_name, table)
+    with raw_connection(using).cursor() as cursor:
+        cursor.execute(TABLE_COLUMNS_SQL, [qualified, qualified])
+        return cursor.fetchall()
+
+
+def reset_sequences(cursor, using, schema_name, tables):
+    """Move every serial/identity sequence past the table's current max"""
+    quote = connections[using].ops.quote_name
+    for table in tables:
+        for column, sequence in table_columns(using, schema_name, table):
+            if sequence:
+                cursor.execute(
+                    f"SELECT setval(%s, COALESCE(MAX({quote(column)}), 1), MAX({quote(column)}) IS NOT NULL) "
+                    f"FROM {qualified_name(using, schema_name, table)}",
+                    [sequence],
+                )
@@ -0,0 +1,29 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# The schema the current request/task wants. Context variables follow a
+# request across await points and into sync_to_async threads, so concurrent
+# ASGI requests never see each other's tenant.
+current_schema = ContextVar("current_schema", default=None)
+# The database alias (shard) that holds that schema; read by helpers.db.routers.
+current_db_alias = ContextVar("current_db_alias", default=None)
+
+
+def get_current_schema():
+    return current_schema.get()
+
+
+def get_current_db_alias():
+    return current_db_alias.get()
+
+
+@contextmanager
+def schema_context(schema_name, db_alias=None):
+    """Scope ``schema_name`` (on ``db_alias``) to the enclosed block (sync or async code)"""
+    token = current_schema.set(schema_name)
+    alias_token = current_db_alias.set(db_alias)
+    try:
+        yield
+    finally:
+        current_db_alias.reset(alias_token)
+        current_schema.reset(token)
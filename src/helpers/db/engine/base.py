@@ -1,4 +1,183 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
 from django.db.backends.postgresql import base
 
+from helpers.db.context import current_db_alias, current_schema
+from helpers.db.statements import ACTIVATE_SCHEMA_LOCAL_SQL, ACTIVATE_SCHEMA_SQL
+
+DEFAULT_SCHEMA = "public"
+CURRENT_SCHEMA_SQL = "SELECT current_schema();"
+
+
+class UnscopedSchemaError(Exception):
+    """A tenant query outside a transaction under transaction-mode pooling"""
+
+
+def reset_pooled_connection(conn):
+    """psycopg_pool reset hook: connections go back to the pool on public"""
+    conn.execute(ACTIVATE_SCHEMA_SQL.format(schema_name=DEFAULT_SCHEMA))
+    if not conn.autocommit:
+        conn.commit()
+
+
 class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Postgres backend that tracks the tenant ``search_path`` per connection.
+
+    ``set_schema`` only records the schema the caller wants. The
+    ``SET search_path`` is sent right before the next cursor is handed out,
+    and only when it differs from what the server session already uses, so
+    a request that never queries never pays for the switch.
+
+    When the ``current_schema`` context variable is set it wins over the
+    connection attribute; that is what keeps async requests that share a
+    thread pool from using each other's search_path. It only applies to the
+    connection of the shard in ``current_db_alias``: with the tenant on
+    another shard, this connection keeps its own schema (public).
+
+    With ``TENANT_SCHEMA_SCOPE = "transaction"`` (PgBouncer transaction
+    pooling) the switch is a ``SET LOCAL`` sent once per transaction, since
+    the pooler may hand the next transaction to a different server session.
+    A session-level SET is never sent in that mode: it would stay on the
+    pooled server session for another client to pick up. Public queries in
+    autocommit need none (server sessions stay on the default path), tenant
+    queries in autocommit raise UnscopedSchemaError.
+    """
     schema_name=None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.schema_name = DEFAULT_SCHEMA
+        # What the server session is known to use; None means unknown.
+        self._applied_schema = None
+        self.transaction_scoped = getattr(settings, "TENANT_SCHEMA_SCOPE", "session") == "transaction"
+        self.schema_stats = {
+            "switches": 0,
+            "redundant_switches": 0,
+            "skipped_switches": 0,
+            "leaked_switches": 0,
+        }
+
+    def set_schema(self, schema_name):
+        if schema_name == self.schema_name:
+            self.schema_stats["redundant_switches"] += 1
+            return
+        if self.schema_name != self._applied_schema:
+            # The previous switch never reached the server.
+            self.schema_stats["skipped_switches"] += 1
+        self.schema_name = schema_name
+
+    def wanted_schema(self):
+        schema_name = current_schema.get()
+        if schema_name and (current_db_alias.get() or DEFAULT_DB_ALIAS) == self.alias:
+            return schema_name
+        return self.schema_name
+
+    def sync_schema(self):
+        schema_name = self.wanted_schema()
+        if schema_name == self._applied_schema:
+            return
+        sql = ACTIVATE_SCHEMA_SQL
+        if self.transaction_scoped:
+            if self.get_autocommit():
+                # Each statement may land on another server session, so
+                # there is nothing a SET could be scoped to.
+                if schema_name == DEFAULT_SCHEMA:
+                    return
+                raise UnscopedSchemaError(
+                    f"Query for schema '{schema_name}' outside a transaction; "
+                    "wrap tenant work in helpers.db.schemas.tenant_transaction()"
+                )
+            sql = ACTIVATE_SCHEMA_LOCAL_SQL
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql.format(schema_name=schema_name))
+        self._applied_schema = schema_name
+        self.schema_stats["switches"] += 1
+
+    def verify_schema(self):
+        """
+        Ask the server which schema is active and resync if we drifted. A
+        server schema other than the one we tracked counts as a leak.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(CURRENT_SCHEMA_SQL)
+            actual = cursor.fetchone()[0]
+        if self._applied_schema is not None and actual != self._applied_schema:
+            self.schema_stats["leaked_switches"] += 1
+        self._applied_schema = actual
+        return actual
+
+    def begin_request(self):
+        """
+        Called at request start. A tenant schema still wanted here was never
+        released by the previous request: that is a leak.
+        """
+        if self.schema_name != DEFAULT_SCHEMA:
+            self.schema_stats["leaked_switches"] += 1
+            self.schema_name = DEFAULT_SCHEMA
+
+    def release_schema(self):
+        """
+        Called at request end. Persistent connections (CONN_MAX_AGE) must not
+        carry a tenant search_path into the next request; the reset itself is
+        lazy and rides along with that request's first query.
+        """
+        if self.connection is not None and getattr(settings, "TENANT_VERIFY_SEARCH_PATH", False):
+            self.verify_schema()
+        self.schema_name = DEFAULT_SCHEMA
+
+    def create_cursor(self, name=None):
+        self.sync_schema()
+        return super().create_cursor(name)
+
+    @property
+    def pool(self):
+        pool_options = self.settings_dict["OPTIONS"].get("pool")
+        if isinstance(pool_options, dict):
+            pool_options.setdefault("reset", reset_pooled_connection)
+        return super().pool
+
+    def pool_stats(self):
+        """psycopg_pool counters plus utilisation and average checkout wait"""
+        pool = self.pool
+        if pool is None:
+            return None
+        stats = pool.get_stats()
+        in_use = stats.get("pool_size", 0) - stats.get("pool_available", 0)
+        requests = stats.get("requests_num", 0)
+        stats["utilisation"] = round(in_use / pool.max_size, 3) if pool.max_size else 0
+        stats["avg_wait_ms"] = round(stats.get("requests_wait_ms", 0) / requests, 3) if requests else 0
+        return stats
+
+    def _configure_connection(self, connection):
+        commit = super()._configure_connection(connection)
+        if self.settings_dict["OPTIONS"].get("pool"):
+            # Runs once per physical connection when the pool opens it.
+            with connection.cursor() as cursor:
+                cursor.execute(ACTIVATE_SCHEMA_SQL.format(schema_name=DEFAULT_SCHEMA))
+            commit = True
+        return commit
+
+    def init_connection_state(self):
+        super().init_connection_state()
+        # Pooled connections are configured and reset onto public by the pool.
+        self._applied_schema = DEFAULT_SCHEMA if self.pool else None
+
+    def _commit(self):
+        if self.transaction_scoped:
+            # SET LOCAL ends with the transaction.
+            self._applied_schema = None
+        return super()._commit()
+
+    def _rollback(self):
+        # A session-level SET issued inside the transaction is undone as well.
+        self._applied_schema = None
+        return super()._rollback()
+
+    def _savepoint_rollback(self, sid):
+        self._applied_schema = None
+        return super()._savepoint_rollback(sid)
+
+    def _close(self):
+        self._applied_schema = None
+        return super()._close()
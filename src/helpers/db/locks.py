@@ -0,0 +1,29 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@contextmanager
+def advisory_lock(name, using=DEFAULT_DB_ALIAS, wait=True):
+    """
+    Session-level Postgres advisory lock keyed on ``hashtext(name)``.
+
+    Yields True once held; with ``wait=False`` yields False instead of
+    blocking when another session holds it. Behind a transaction-mode
+    pooler take it inside a transaction, or the unlock may reach another
+    server session. Other databases have no advisory locks and get a
+    no-op that yields True (SQLite serialises writers anyway).
+    """
+    if connections[using].vendor != "postgresql":
+        yield True
+        return
+    function = "pg_advisory_lock" if wait else "pg_try_advisory_lock"
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"SELECT {function}(hashtext(%s))", [name])
+        acquired = True if wait else cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connections[using].cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", [name])
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection as default_connection
+
+LOAD_SCHEMAS_SQL = "SELECT nspname FROM pg_catalog.pg_namespace;"
+PROBE_SCHEMA_SQL = "SELECT 1 FROM pg_catalog.pg_namespace WHERE nspname = %s;"
+
+
+class SchemaRegistry:
+    """
+    Process-wide set of schema names, one set per database alias.
+
+    Loaded from ``pg_namespace`` the first time a connection is checked and
+    kept current by ``create_schema``/``drop_schema``. A name we have not
+    seen is probed once more, since another process may have created it.
+    Drops and renames done by other processes (relocation, pool claims) are
+    only seen once the set is reloaded, so it is re-read after ``ttl`` seconds.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._schemas = {}
+        self._lock = threading.Lock()
+
+    def _names(self, connection):
+        entry = self._schemas.get(connection.alias)
+        if entry is None or entry[1] < time.monotonic():
+            with connection.cursor() as cursor:
+                cursor.execute(LOAD_SCHEMAS_SQL)
+                names = {row[0] for row in cursor.fetchall()}
+            with self._lock:
+                current = self._schemas.get(connection.alias)
+                if current is None or current is entry:
+                    self._schemas[connection.alias] = entry = (names, time.monotonic() + self.ttl)
+                else:
+                    entry = current
+        return entry[0]
+
+    def exists(self, schema_name, connection=None):
+        connection = connection or default_connection
+        if schema_name in self._names(connection):
+            return True
+        with connection.cursor() as cursor:
+            cursor.execute(PROBE_SCHEMA_SQL, [schema_name])
+            found = cursor.fetchone() is not None
+        if found:
+            self.add(schema_name, connection)
+        return found
+
+    def add(self, schema_name, connection=None):
+        connection = connection or default_connection
+        with self._lock:
+            entry = self._schemas.get(connection.alias)
+            if entry is not None:
+                entry[0].add(schema_name)
+
+    def discard(self, schema_name, connection=None):
+        connection = connection or default_connection
+        with self._lock:
+            entry = self._schemas.get(connection.alias)
+            if entry is not None:
+                entry[0].discard(schema_name)
+
+    def reload(self, connection=None):
+        """Forget the cached names so the next check re-reads pg_namespace"""
+        with self._lock:
+            if connection is None:
+                self._schemas.clear()
+            else:
+                self._schemas.pop(connection.alias, None)
+
+
+schema_registry = SchemaRegistry(ttl=getattr(settings, "TENANT_SCHEMA_REGISTRY_TTL", 30))
@@ -0,0 +1,267 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+from .bloom import BloomFilter
+
+RESOLVER_CACHE_PREFIX = "tenant-resolver"
+BLOOM_VERSION_KEY = f"{RESOLVER_CACHE_PREFIX}:bloom-version"
+# Subdomains created since the filters were built: a counter plus one key per name
+BLOOM_ADDED_KEY = f"{RESOLVER_CACHE_PREFIX}:bloom-added"
+BLOOM_ADDED_TTL = 24 * 60 * 60
+# Backends whose data other processes never see; the Bloom filter needs a
+# shared version key and counter
+UNSHARED_CACHE_BACKENDS = (
+    "django.core.cache.backends.dummy.DummyCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+)
+
+
+def cache_is_shared(alias="default"):
+    return settings.CACHES.get(alias, {}).get("BACKEND") not in UNSHARED_CACHE_BACKENDS
+
+
+class LRUCache:
+    """
+    Small thread-safe LRU with a per-entry expiry.
+
+    Used as the in-process (L1) tier in front of the shared Django cache so
+    a hot tenant never leaves the worker's memory.
+    """
+
+    def __init__(self, maxsize=2048, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TenantResolver:
+    """
+    Resolves a subdomain to its tenant record.
+
+    Lookup order is L1 (process LRU) -> L2 (Django/Redis cache) -> public
+    schema. Entries are plain dicts so they survive pickling into Redis.
+
+    Unknown subdomains are remembered for a short TTL in both tiers, and an
+    optional Bloom filter of every valid subdomain rejects most of them
+    before the database is ever asked. New subdomains are published through
+    a shared counter and added to every process's filter as it sees them;
+    the filter is only rebuilt when the shared version key changes, which
+    happens when a subdomain is deleted or renamed, or the counter is
+    lost. Only usable with a cache all processes share. The in-process miss
+    tier is kept much shorter than the shared one because other processes
+    cannot evict it.
+    """
+
+    def __init__(self, l1_size=2048, l1_ttl=60, l2_ttl=600, miss_ttl=30, l1_miss_ttl=5, bloom=False, bloom_fp_rate=0.01):
+        self.l1 = LRUCache(maxsize=l1_size, ttl=l1_ttl)
+        self.l2_ttl = l2_ttl
+        self.misses = LRUCache(maxsize=l1_size, ttl=l1_miss_ttl)
+        self.miss_ttl = miss_ttl
+        self.bloom_enabled = bloom
+        self.bloom_fp_rate = bloom_fp_rate
+        self._bloom = None
+        self._bloom_version = None
+        self._bloom_added = 0
+        self._bloom_lock = threading.Lock()
+
+    def cache_key(self, subdomain):
+        return f"{RESOLVER_CACHE_PREFIX}:{subdomain}"
+
+    def miss_key(self, subdomain):
+        return f"{RESOLVER_CACHE_PREFIX}-miss:{subdomain}"
+
+    def schema_key(self, schema_name):
+        return f"{RESOLVER_CACHE_PREFIX}-schema:{schema_name}"
+
+    def added_key(self, number):
+        return f"{BLOOM_ADDED_KEY}:{number}"
+
+    def fence_key(self, subdomain):
+        return f"tenant-fence:{subdomain}"
+
+    def fence(self, subdomain, timeout):
+        """Block writes for ``subdomain`` in every process (shard relocation)"""
+        cache.set(self.fence_key(subdomain), True, timeout)
+
+    def unfence(self, subdomain):
+        cache.delete(self.fence_key(subdomain))
+
+    def is_fenced(self, subdomain):
+        # Straight to the shared cache: a fence has to be seen by every worker.
+        return bool(subdomain) and bool(cache.get(self.fence_key(subdomain)))
+
+    def resolve(self, subdomain):
+        """Return the tenant record for ``subdomain`` or None if unknown."""
+        record = self.l1.get(subdomain)
+        if record is not None:
+            return record
+        if self.misses.get(subdomain):
+            return None
+
+        # One round trip for the record, the negative entry and the filter state
+        keys = [self.cache_key(subdomain), self.miss_key(subdomain), BLOOM_VERSION_KEY, BLOOM_ADDED_KEY]
+        values = cache.get_many(keys)
+        record = values.get(keys[0])
+        if record is None:
+            if values.get(keys[1]):
+                self.misses.set(subdomain, True)
+                return None
+            bloom = self.bloom_enabled and self.get_bloom(values.get(BLOOM_VERSION_KEY), values.get(BLOOM_ADDED_KEY) or 0)
+            if bloom and subdomain not in bloom:
+                self.remember_miss(subdomain)
+                return None
+            record = self.load(subdomain)
+            if record is None:
+                self.remember_miss(subdomain)
+                return None
+            cache.set(self.cache_key(subdomain), record, self.l2_ttl)
+
+        self.l1.set(subdomain, record)
+        return record
+
+    def resolve_schema(self, schema_name):
+        """Same as resolve() but keyed by schema name (used for shard lookups)."""
+        key = self.schema_key(schema_name)
+        record = self.l1.get(key)
+        if record is not None:
+            return record
+        record = cache.get(key)
+        if record is None:
+            record = self.load(schema_name=schema_name)
+            if record is None:
+                return None
+            cache.set(key, record, self.l2_ttl)
+        self.l1.set(key, record)
+        return record
+
+    def remember_miss(self, subdomain):
+        self.misses.set(subdomain, True)
+        cache.set(self.miss_key(subdomain), True, self.miss_ttl)
+
+    def get_bloom(self, version, added=0):
+        with self._bloom_lock:
+            current = self._bloom is not None and version is not None and version == self._bloom_version
+            # A counter below ours was reset or evicted: its numbers mean
+            # nothing to us any more, rebuild
+            if current and (added == self._bloom_added or (added > self._bloom_added and self._apply_additions(added))):
+                return self._bloom
+            if version is None:
+                cache.add(BLOOM_VERSION_KEY, uuid.uuid4().hex, None)
+                version = cache.get(BLOOM_VERSION_KEY)
+            # Names published after this point are picked up as additions
+            self._bloom_added = added
+            self._bloom = BloomFilter.from_items(self.load_subdomains(), self.bloom_fp_rate)
+            self._bloom_version = version
+            return self._bloom
+
+    def _apply_additions(self, added):
+        """Add the names published since our last look; False when some expired (rebuild instead)"""
+        names = cache.get_many([self.added_key(n) for n in range(self._bloom_added + 1, added + 1)])
+        if len(names) < added - self._bloom_added:
+            return False
+        for name in names.values():
+            self._bloom.add(name)
+            self.misses.delete(name)
+        self._bloom_added = added
+        return True
+
+    def publish_subdomain(self, subdomain):
+        """A new subdomain: every process adds it to its filter, no rebuild"""
+        self.misses.delete(subdomain)
+        if cache.add(BLOOM_ADDED_KEY, 0, None):
+            # New (or evicted) counter: numbering restarts, so every process
+            # rebuilds rather than trust the numbers it has seen
+            cache.set(BLOOM_VERSION_KEY, uuid.uuid4().hex, None)
+        try:
+            number = cache.incr(BLOOM_ADDED_KEY)
+        except ValueError:
+            # Cache backends that store nothing (dummy)
+            return
+        cache.set(self.added_key(number), subdomain, BLOOM_ADDED_TTL)
+        with self._bloom_lock:
+            if self._bloom is not None:
+                self._bloom.add(subdomain)
+
+    def load(self, subdomain=None, schema_name=None):
+        from .schemas import use_public_schema
+
+        Tenants = apps.get_model('tenants', 'Tenants')
+        lookup = {'subdomain': subdomain} if subdomain is not None else {'schema_name': schema_name}
+        with use_public_schema():
+            row = Tenants.objects.filter(**lookup).values('schema_name', 'db_alias').first()
+        if row is None:
+            return None
+        return {"schema_name": row["schema_name"], "db_alias": row["db_alias"]}
+
+    def load_subdomains(self):
+        from .schemas import use_public_schema
+
+        Tenants = apps.get_model('tenants', 'Tenants')
+        with use_public_schema():
+            return list(Tenants.objects.values_list('subdomain', flat=True))
+
+    def invalidate(self, subdomain, schema_name=None, removed=False):
+        """
+        Evict cached entries. ``removed`` (deleted or renamed away) also
+        makes every process rebuild its Bloom filter on the next miss; a
+        stale name in the filter only costs a false positive, so plain
+        updates leave it alone.
+        """
+        if schema_name:
+            self.l1.delete(self.schema_key(schema_name))
+            cache.delete(self.schema_key(schema_name))
+        if not subdomain:
+            return
+        self.l1.delete(subdomain)
+        self.misses.delete(subdomain)
+        cache.delete_many([self.cache_key(subdomain), self.miss_key(subdomain)])
+        if removed:
+            cache.set(BLOOM_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+tenant_resolver = TenantResolver(
+    l1_size=getattr(settings, "TENANT_RESOLVER_L1_SIZE", 2048),
+    l1_ttl=getattr(settings, "TENANT_RESOLVER_L1_TTL", 60),
+    l2_ttl=getattr(settings, "TENANT_RESOLVER_CACHE_TTL", 600),
+    miss_ttl=getattr(settings, "TENANT_RESOLVER_MISS_TTL", 30),
+    l1_miss_ttl=getattr(settings, "TENANT_RESOLVER_L1_MISS_TTL", 5),
+    bloom=getattr(settings, "TENANT_RESOLVER_BLOOM", False) and cache_is_shared(),
+    bloom_fp_rate=getattr(settings, "TENANT_RESOLVER_BLOOM_FP_RATE", 0.01),
+)
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .context import current_db_alias
+
+# Apps whose tables only matter in the public schema of the primary.
+PUBLIC_ONLY_APP_LABELS = getattr(settings, "PUBLIC_ONLY_APP_LABELS", ["tenants"])
+
+
+class TenantShardRouter:
+    """
+    Sends queries to the database (shard) holding the active tenant.
+
+    Tenant schemas get every table their migrations depend on (auth,
+    accounts, sessions, ... as well as CUSTOMER_INSTALLED_APPS) and the
+    search_path decides which copy is used, so everything follows the
+    tenant except the public-only registry apps, which stay on the primary.
+    """
+
+    def _db_for(self, model):
+        if model._meta.app_label in PUBLIC_ONLY_APP_LABELS:
+            return DEFAULT_DB_ALIAS
+        return current_db_alias.get()
+
+    def db_for_read(self, model, **hints):
+        return self._db_for(model)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for(model)
@@ -1,52 +1,132 @@
 from contextlib import contextmanager
-from django.db import connection
-from .statements import ACTIVATE_SCHEMA_SQL,CREATE_SCHEMA_SQL
-from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from .statements import ACTIVATE_SCHEMA_SQL,CREATE_SCHEMA_SQL,DROP_SCHEMA_SQL,RENAME_SCHEMA_SQL
+from .context import current_db_alias, current_schema
+from .registry import schema_registry
+from .resolvers import tenant_resolver
 from django.apps import apps
 from django.conf import settings
 DEFAULT_SCHEMA = "public"
 
-def does_schema_exists(schema_name):
-    exists=False
-    with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT schema_name 
-                    FROM information_schema.schemata 
-                    WHERE schema_name = %s
-                """, [schema_name])
-                exists = bool(cursor.fetchone())
-    return exists
-
-def activate_tenant_schema(schema_name):
-    if not hasattr(connection, "schema_name"):
-        connection.schema_name = DEFAULT_SCHEMA
-
-    if connection.schema_name==schema_name:
-        print(schema_name,' is already')
-        return
-    if schema_name != DEFAULT_SCHEMA:
-        if not does_schema_exists(schema_name):
+def schema_is_transaction_scoped():
+    return getattr(settings, "TENANT_SCHEMA_SCOPE", "session") == "transaction"
+
+@contextmanager
+def tenant_transaction(using=None):
+    """
+    Behind a transaction-mode pooler the tenant search_path only holds for
+    the current transaction, so tenant work has to run inside one.
+    """
+    if schema_is_transaction_scoped():
+        with transaction.atomic(using=using):
+            yield
+    else:
+        yield
+
+def get_schema_db_alias(schema_name):
+    """Database alias (shard) holding ``schema_name``"""
+    if schema_name == DEFAULT_SCHEMA or len(settings.DATABASES) == 1:
+        return DEFAULT_DB_ALIAS
+    tenant = tenant_resolver.resolve_schema(schema_name)
+    if tenant is None:
+        return DEFAULT_DB_ALIAS
+    return tenant.get("db_alias") or DEFAULT_DB_ALIAS
+
+def does_schema_exists(schema_name, using=DEFAULT_DB_ALIAS):
+    return schema_registry.exists(schema_name, connections[using])
+
+def create_schema(schema_name, using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            CREATE_SCHEMA_SQL.format(schema_name=schema_name)
+        )
+    schema_registry.add(schema_name, connections[using])
+    print(f"Created schema: {schema_name}")
+
+def drop_schema(schema_name, using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            DROP_SCHEMA_SQL.format(schema_name=schema_name)
+        )
+    schema_registry.discard(schema_name, connections[using])
+    print(f"Dropped schema: {schema_name}")
+
+def rename_schema(schema_name, new_name, using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            RENAME_SCHEMA_SQL.format(schema_name=schema_name, new_name=new_name)
+        )
+    schema_registry.discard(schema_name, connections[using])
+    schema_registry.add(new_name, connections[using])
+    print(f"Renamed schema: {schema_name} -> {new_name}")
+
+def get_active_schema():
+    return current_schema.get() or getattr(connection, "schema_name", None) or DEFAULT_SCHEMA
+
+def activate_tenant_schema(schema_name, using=None):
+    if using is None:
+        using = get_schema_db_alias(schema_name)
+    active_schema = get_active_schema()
+    if schema_name != active_schema and schema_name != DEFAULT_SCHEMA:
+        if not does_schema_exists(schema_name, using):
             schema_name=DEFAULT_SCHEMA
+            using=DEFAULT_DB_ALIAS
+
+    tenant_connection = connections[using]
+    if hasattr(tenant_connection, "set_schema"):
+        # helpers.db.engine applies the search_path lazily before the next
+        # query; helpers.db.routers sends tenant queries to ``using``
+        current_schema.set(schema_name)
+        current_db_alias.set(using)
+        tenant_connection.set_schema(schema_name)
+        if schema_name == DEFAULT_SCHEMA:
+            # Back on public: no shard keeps the tenant it had before
+            for conn in connections.all(initialized_only=True):
+                if conn is tenant_connection or not hasattr(conn, "set_schema"):
+                    continue
+                if conn.schema_name != DEFAULT_SCHEMA:
+                    conn.set_schema(DEFAULT_SCHEMA)
+        return
+
+    if active_schema==schema_name:
+        return
     with connection.cursor() as cursor:
         cursor.execute(
             ACTIVATE_SCHEMA_SQL.format(schema_name=schema_name)
         )
-        connection.schema_name=schema_name
-        print('now we have Activated ',schema_name,'Connection schema ',connection.schema_name)
+    connection.schema_name=schema_name
+
+def resolve_request_schema(subdomain=None):
+    """get_schema_name plus the existence check, without touching the connection"""
+    schema_name, valid_tenant, subdomain = get_schema_name(subdomain)
+    using = get_schema_db_alias(schema_name)
+    if schema_name != DEFAULT_SCHEMA and not does_schema_exists(schema_name, using):
+        schema_name = DEFAULT_SCHEMA
+        using = DEFAULT_DB_ALIAS
+    return schema_name, using, valid_tenant, subdomain
+
+def begin_tenant_request():
+    """Request start: count (and clear) a tenant search_path the last request left behind"""
+    for conn in connections.all(initialized_only=True):
+        if hasattr(conn, "begin_request"):
+            conn.begin_request()
+
+def release_tenant_schema():
+    """Drop the tenant search_path at request end so it can't leak into the next one"""
+    for conn in connections.all(initialized_only=True):
+        if hasattr(conn, "release_schema"):
+            conn.release_schema()
     
 @contextmanager
 def use_tenant_schema_for_auth(schema_name, create_if_missing=True, revert_public=True):
+    using = get_schema_db_alias(schema_name)
     try:
         # Create schema if needed
-        if create_if_missing and not does_schema_exists(schema_name):
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    CREATE_SCHEMA_SQL.format(schema_name=schema_name)
-                )
-                print(f"Created schema: {schema_name}")
+        if create_if_missing and not does_schema_exists(schema_name, using):
+            create_schema(schema_name, using)
         
         # ACTIVATE the tenant schema before yielding
-        activate_tenant_schema(schema_name)
+        activate_tenant_schema(schema_name, using)
         print(f"Activated tenant schema: {schema_name}")
         
         yield
@@ -56,29 +136,28 @@ def use_tenant_schema_for_auth(schema_name, create_if_missing=True, revert_publi
         if revert_public:
             activate_tenant_schema(DEFAULT_SCHEMA)
 @contextmanager
-def use_tenant_schema(schema_name, create_if_missing=True, revert_public=True):
-    previous_schema = getattr(connection, 'schema_name', DEFAULT_SCHEMA)
+def use_tenant_schema(schema_name, create_if_missing=True, revert_public=True, using=None):
+    previous_schema = get_active_schema()
+    if using is None:
+        using = get_schema_db_alias(schema_name)
     
-    try:
-        # Create schema if needed
-        if create_if_missing and not does_schema_exists(schema_name):
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    CREATE_SCHEMA_SQL.format(schema_name=schema_name)
-                )
-                print(f"Created schema: {schema_name}")
-        
-        # ACTIVATE the tenant schema before yielding
-        activate_tenant_schema(schema_name)
-        print(f"Activated tenant schema: {schema_name}")
-        
-        yield
-    finally:
-        # Revert to previous or public schema
-        if revert_public:
-            activate_tenant_schema(DEFAULT_SCHEMA)
-        else:
-            activate_tenant_schema(previous_schema)
+    with tenant_transaction(using):
+        try:
+            # Create schema if needed
+            if create_if_missing and not does_schema_exists(schema_name, using):
+                create_schema(schema_name, using)
+            
+            # ACTIVATE the tenant schema before yielding
+            activate_tenant_schema(schema_name, using)
+            print(f"Activated tenant schema: {schema_name}")
+            
+            yield
+        finally:
+            # Revert to previous or public schema
+            if revert_public:
+                activate_tenant_schema(DEFAULT_SCHEMA)
+            else:
+                activate_tenant_schema(previous_schema)
 
 
 
@@ -103,23 +182,12 @@ def get_schema_name(subdomain=None):
     if subdomain is None or subdomain=="localhost" or subdomain==settings.MAIN_SUBDOMAIN:
         activate_tenant_schema(schema_name)
         return schema_name,True,"public"
-    # cache_value=cache.get(subdomain)
-    # if cache_value:
-    #     print('cache hit')
-    #     print('cache value : ',cache_value)
-    #     return cache_value,True,subdomain
-    else :
-        with use_public_schema():
-            Tenants=apps.get_model('tenants','Tenants')
-            try:
-                obj=Tenants.objects.get(subdomain=subdomain)
-                schema_name=obj.schema_name
-            except Tenants.DoesNotExist:
-                print(subdomain," does not exist in public schema as a tenant")
-                return "public",False,"public"
-            except Exception as e:
-                print('Exception occured ==>',e)
-            # cache_ttl=600  # Cache timeout in seconds (e.g., 10 minutes)
-            # cache.set(subdomain,schema_name,cache_ttl)
-            # print('cache miss for subdomain ',subdomain,' and schema name : ',schema_name)
-    return schema_name,True,subdomain
+    try:
+        tenant=tenant_resolver.resolve(subdomain)
+    except Exception as e:
+        print('Exception occured ==>',e)
+        return schema_name,True,subdomain
+    if tenant is None:
+        print(subdomain," does not exist in public schema as a tenant")
+        return "public",False,"public"
+    return tenant["schema_name"],True,subdomain
@@ -1,4 +1,6 @@
 
 CREATE_SCHEMA_SQL='CREATE SCHEMA IF NOT EXISTS "{schema_name}";'
 ACTIVATE_SCHEMA_SQL='SET search_path TO "{schema_name}";'
-DROP_SCHEMA_SQL='DROP SCHEMA IF EXISTS "{schema_name}" CASCADE;'
\ No newline at end of file
+ACTIVATE_SCHEMA_LOCAL_SQL='SET LOCAL search_path TO "{schema_name}";'
+DROP_SCHEMA_SQL='DROP SCHEMA IF EXISTS "{schema_name}" CASCADE;'
+RENAME_SCHEMA_SQL='ALTER SCHEMA "{schema_name}" RENAME TO "{new_name}";'
\ No newline at end of file
@@ -1,32 +1,111 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
 from django.http import HttpResponse
-from helpers.db.schemas import activate_tenant_schema,get_schema_name
+from helpers.db.context import get_current_db_alias, schema_context
+from helpers.db.resolvers import tenant_resolver
+from helpers.db.schemas import DEFAULT_SCHEMA,activate_tenant_schema,begin_tenant_request,release_tenant_schema,resolve_request_schema,tenant_transaction
+from tenants.lazy import ensure_tenant_schema_current
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+# Migrate a tenant schema on its first request after a deploy (see tenants.lazy)
+LAZY_MIGRATE = getattr(settings, "TENANT_LAZY_MIGRATE", False)
+
+
+def fenced_response(request):
+    """503 for writes to a tenant that is being moved to another shard"""
+    if request.method in SAFE_METHODS or not request.valid_tenant:
+        return None
+    if not tenant_resolver.is_fenced(request.subdomain):
+        return None
+    response = HttpResponse("This workspace is briefly read-only for maintenance, please retry.", status=503)
+    response["Retry-After"] = "30"
+    return response
+
+
+def get_request_subdomain(request):
+    host = request.get_host().split(':')[0]
+
+    parts = host.split('.')
+
+    if len(parts) < 3:
+        return None
+    return parts[0]
+
+
+def begin_and_resolve(subdomain):
+    # One thread hop for both on the async path
+    begin_tenant_request()
+    return resolve_request_schema(subdomain)
 
 
 class SchemaTenantMiddleware:
+    """
+    Resolves the tenant from the subdomain and scopes its schema to the request.
+
+    Works natively under both WSGI and ASGI. The schema lives in the
+    ``current_schema`` context variable, so concurrent async requests (and the
+    threads their ORM calls run in) each keep their own tenant.
+
+    With TENANT_SCHEMA_SCOPE = "transaction" each request runs in a single
+    transaction so its SET LOCAL search_path survives a transaction-mode
+    pooler. transaction.atomic() is sync-only, so that mode runs sync.
+    """
+    sync_capable = True
+    async_capable = getattr(settings, "TENANT_SCHEMA_SCOPE", "session") != "transaction"
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        host = request.get_host().split(':')[0]
-
-        parts = host.split('.')
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
 
-        if len(parts) < 3:
-            subdomain = None
-        else:
-            subdomain = parts[0]
+        subdomain = get_request_subdomain(request)
 
-        schema_name, valid_tenant, subdomain = get_schema_name(subdomain)
+        begin_tenant_request()
+        # Resolution and the lazy migrate check only read public (or
+        # schema-qualified) tables, so they need no tenant transaction; the
+        # migration itself runs in its own. A tenant whose schema does not
+        # exist (yet) falls back to public here, before the context is set.
+        with schema_context(DEFAULT_SCHEMA):
+            schema_name, using, valid_tenant, subdomain = resolve_request_schema(subdomain)
+            if LAZY_MIGRATE and valid_tenant:
+                ensure_tenant_schema_current(schema_name, using)
 
-        activate_tenant_schema(schema_name)
+        try:
+            with schema_context(schema_name, using):
+                activate_tenant_schema(schema_name, using)
 
-        request.subdomain = subdomain
-        request.valid_tenant = valid_tenant
+                request.subdomain = subdomain
+                request.valid_tenant = valid_tenant
 
-        response = self.get_response(request)
+                response = fenced_response(request)
+                if response is not None:
+                    return response
+                with tenant_transaction(get_current_db_alias()):
+                    response = self.get_response(request)
+        finally:
+            release_tenant_schema()
         return response
 
+    async def __acall__(self, request):
+        subdomain = get_request_subdomain(request)
 
-    
+        schema_name, using, valid_tenant, subdomain = await sync_to_async(begin_and_resolve)(subdomain)
+        if LAZY_MIGRATE and valid_tenant:
+            await sync_to_async(ensure_tenant_schema_current)(schema_name, using)
 
-    
\ No newline at end of file
+        request.subdomain = subdomain
+        request.valid_tenant = valid_tenant
+
+        response = await sync_to_async(fenced_response)(request)
+        if response is not None:
+            return response
+        try:
+            with schema_context(schema_name, using):
+                response = await self.get_response(request)
+        finally:
+            await sync_to_async(release_tenant_schema)()
+        return response
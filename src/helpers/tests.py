@@ -0,0 +1,395 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from helpers.db.bloom import BloomFilter
+from helpers.db.context import current_db_alias, current_schema, get_current_db_alias, get_current_schema
+from helpers.db.engine.base import DatabaseWrapper, UnscopedSchemaError, reset_pooled_connection
+from helpers.db.locks import advisory_lock
+from helpers.db.registry import LOAD_SCHEMAS_SQL, SchemaRegistry
+from helpers.db.resolvers import BLOOM_ADDED_KEY, LRUCache, TenantResolver, cache_is_shared, tenant_resolver
+from helpers.middleware.schemas import SchemaTenantMiddleware
+
+
+class SchemaTenantMiddlewareTestCase(TestCase):
+
+    def setUp(self):
+        self.seen = {}
+
+        def get_response(request):
+            self.seen.update(schema=get_current_schema(), using=get_current_db_alias())
+            return HttpResponse("ok")
+
+        self.middleware = SchemaTenantMiddleware(get_response)
+
+    def get(self, host):
+        request = RequestFactory().get("/", HTTP_HOST=host)
+        return request, self.middleware(request)
+
+    def test_unprovisioned_tenant_falls_back_to_public(self):
+        tenant = {"schema_name": "tenant_acme", "db_alias": DEFAULT_DB_ALIAS}
+        with mock.patch.object(tenant_resolver, "resolve", return_value=tenant), \
+                mock.patch("helpers.db.schemas.does_schema_exists", return_value=False) as exists:
+            request, response = self.get("acme.scalesphere.space")
+        self.assertEqual(response.status_code, 200)
+        exists.assert_called_once_with("tenant_acme", DEFAULT_DB_ALIAS)
+        self.assertEqual(self.seen, {"schema": "public", "using": DEFAULT_DB_ALIAS})
+        self.assertEqual(request.subdomain, "acme")
+        self.assertTrue(request.valid_tenant)
+
+    def test_unknown_subdomain_is_public(self):
+        with mock.patch.object(tenant_resolver, "resolve", return_value=None):
+            request, response = self.get("nobody.scalesphere.space")
+        self.assertEqual(self.seen["schema"], "public")
+        self.assertFalse(request.valid_tenant)
+
+
+class AdvisoryLockTestCase(TestCase):
+
+    def test_lock(self):
+        for wait in (True, False):
+            with self.subTest(wait=wait), advisory_lock("helpers-tests", wait=wait) as acquired:
+                self.assertTrue(acquired)
+
+    def test_no_sql_outside_postgres(self):
+        if connection.vendor == "postgresql":
+            self.skipTest("Postgres takes the lock")
+        with self.assertNumQueries(0), advisory_lock("helpers-tests") as acquired:
+            self.assertTrue(acquired)
+
+
+def fake_resolver(subdomains, **kwargs):
+    """TenantResolver over the test cache, reading tenants from ``subdomains`` instead of the database"""
+    resolver = TenantResolver(**kwargs)
+    resolver.load = lambda subdomain=None, schema_name=None: (
+        {"schema_name": f"tenant_{subdomain}", "db_alias": DEFAULT_DB_ALIAS} if subdomain in subdomains else None
+    )
+    resolver.load_subdomains = lambda: list(subdomains)
+    return resolver
+
+
+class BloomResolverTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.subdomains = {"acme"}
+        # No L1 or miss caching, so every resolve goes through the filter
+        self.worker = fake_resolver(self.subdomains, bloom=True, l1_ttl=0, l1_miss_ttl=0, miss_ttl=0)
+        self.signup = fake_resolver(self.subdomains, bloom=True)
+
+    def signup_tenant(self, subdomain):
+        self.subdomains.add(subdomain)
+        self.signup.publish_subdomain(subdomain)
+
+    def test_published_subdomain_is_seen(self):
+        self.assertIsNotNone(self.worker.resolve("acme"))
+        self.assertIsNone(self.worker.resolve("beta"))
+        self.signup_tenant("beta")
+        self.assertIsNotNone(self.worker.resolve("beta"))
+
+    def test_evicted_counter(self):
+        self.signup_tenant("beta")
+        self.assertIsNotNone(self.worker.resolve("beta"))
+        cache.delete(BLOOM_ADDED_KEY)
+        self.signup_tenant("gamma")
+        self.assertIsNotNone(self.worker.resolve("gamma"))
+
+    def test_reset_counter(self):
+        self.signup_tenant("beta")
+        self.signup_tenant("gamma")
+        self.assertIsNotNone(self.worker.resolve("gamma"))
+        # Counter restarted below what the worker has applied, version kept
+        cache.set(BLOOM_ADDED_KEY, 0, None)
+        self.subdomains.add("delta")
+        self.signup.publish_subdomain("delta")
+        self.assertIsNotNone(self.worker.resolve("delta"))
+
+    def test_unshared_cache_backends(self):
+        self.assertFalse(cache_is_shared())
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            self.assertFalse(cache_is_shared())
+        with override_settings(CACHES={"default": {"BACKEND": "django_redis.cache.RedisCache", "LOCATION": "redis://"}}):
+            self.assertTrue(cache_is_shared())
+
+
+class LRUCacheTestCase(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(maxsize=2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        self.assertEqual(lru.get("a"), 1)
+        lru.set("c", 3)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual((lru.get("a"), lru.get("c")), (1, 3))
+        self.assertEqual(len(lru), 2)
+
+    def test_entries_expire(self):
+        lru = LRUCache(ttl=10)
+        with mock.patch("helpers.db.resolvers.time.monotonic", return_value=100):
+            lru.set("a", 1)
+        with mock.patch("helpers.db.resolvers.time.monotonic", return_value=110):
+            self.assertEqual(lru.get("a"), 1)
+        with mock.patch("helpers.db.resolvers.time.monotonic", return_value=111):
+            self.assertIsNone(lru.get("a"))
+        self.assertEqual(len(lru), 0)
+
+    def test_delete(self):
+        lru = LRUCache()
+        lru.set("a", 1)
+        lru.delete("a")
+        lru.delete("missing")
+        self.assertIsNone(lru.get("a"))
+
+
+class TenantResolverTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.resolver = fake_resolver({"acme"})
+        self.load = mock.Mock(wraps=self.resolver.load)
+        self.resolver.load = self.load
+
+    def test_tiers(self):
+        record = {"schema_name": "tenant_acme", "db_alias": DEFAULT_DB_ALIAS}
+        self.assertEqual(self.resolver.resolve("acme"), record)
+        self.assertEqual(self.resolver.resolve("acme"), record)
+        self.assertEqual(self.load.call_count, 1)
+        # Another process: empty L1, served by the shared cache
+        other = fake_resolver(set())
+        self.assertEqual(other.resolve("acme"), record)
+
+    def test_misses_are_remembered(self):
+        self.assertIsNone(self.resolver.resolve("nobody"))
+        self.assertIsNone(self.resolver.resolve("nobody"))
+        self.assertEqual(self.load.call_count, 1)
+        self.assertIsNone(fake_resolver({"nobody"}).resolve("nobody"))
+
+    def test_invalidate(self):
+        self.resolver.resolve("acme")
+        self.resolver.invalidate("acme")
+        self.resolver.resolve("acme")
+        self.assertEqual(self.load.call_count, 2)
+
+
+class FakeConnection:
+    """Just enough of a connection for SchemaRegistry: answers pg_namespace queries from ``schemas``"""
+    alias = "fake"
+
+    def __init__(self, schemas):
+        self.schemas = set(schemas)
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.connection.queries.append(sql)
+        if sql == LOAD_SCHEMAS_SQL:
+            self.rows = [(name,) for name in sorted(self.connection.schemas)]
+        else:
+            self.rows = [(1,)] if params[0] in self.connection.schemas else []
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+class SchemaRegistryTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.connection = FakeConnection({"public", "tenant_acme"})
+        self.registry = SchemaRegistry(ttl=30)
+
+    def test_loaded_once(self):
+        self.assertTrue(self.registry.exists("tenant_acme", self.connection))
+        self.assertTrue(self.registry.exists("public", self.connection))
+        self.assertEqual(self.connection.queries, [LOAD_SCHEMAS_SQL])
+
+    def test_unknown_name_is_probed(self):
+        self.registry.exists("public", self.connection)
+        self.connection.schemas.add("tenant_new")
+        self.assertTrue(self.registry.exists("tenant_new", self.connection))
+        self.assertFalse(self.registry.exists("tenant_missing", self.connection))
+        # Found by the probe, so not probed again
+        self.assertTrue(self.registry.exists("tenant_new", self.connection))
+        self.assertEqual(len(self.connection.queries), 3)
+
+    def test_add_and_discard(self):
+        self.registry.exists("public", self.connection)
+        self.registry.add("tenant_beta", self.connection)
+        self.registry.discard("tenant_acme", self.connection)
+        self.connection.schemas.discard("tenant_acme")
+        self.assertTrue(self.registry.exists("tenant_beta", self.connection))
+        self.assertFalse(self.registry.exists("tenant_acme", self.connection))
+
+    def test_reloaded_after_ttl(self):
+        with mock.patch("helpers.db.registry.time.monotonic", return_value=100):
+            self.registry.exists("public", self.connection)
+        # Dropped by another process
+        self.connection.schemas.discard("tenant_acme")
+        with mock.patch("helpers.db.registry.time.monotonic", return_value=129):
+            self.assertTrue(self.registry.exists("tenant_acme", self.connection))
+        with mock.patch("helpers.db.registry.time.monotonic", return_value=131):
+            self.assertFalse(self.registry.exists("tenant_acme", self.connection))
+        self.assertEqual(self.connection.queries.count(LOAD_SCHEMAS_SQL), 2)
+
+
+class BloomFilterTestCase(SimpleTestCase):
+
+    def test_no_false_negatives(self):
+        items = [f"tenant-{n}" for n in range(5000)]
+        bloom = BloomFilter.from_items(items, fp_rate=0.01)
+        self.assertTrue(all(item in bloom for item in items))
+        later = BloomFilter.from_items([], fp_rate=0.01)
+        later.add("acme")
+        self.assertIn("acme", later)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter.from_items((f"tenant-{n}" for n in range(5000)), fp_rate=0.01)
+        false_positives = sum(f"other-{n}" in bloom for n in range(20000))
+        # 1% target, with slack for the sample
+        self.assertLess(false_positives / 20000, 0.02)
+
+
+def fake_wrapper(alias=DEFAULT_DB_ALIAS, options=None):
+    """helpers.db.engine wrapper over a mock psycopg connection; no server needed"""
+    wrapper = DatabaseWrapper({
+        "NAME": "tenants", "USER": "", "PASSWORD": "", "HOST": "", "PORT": "", "OPTIONS": options or {},
+        "TIME_ZONE": None, "CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "AUTOCOMMIT": True,
+        "ATOMIC_REQUESTS": False, "TEST": {},
+    }, alias)
+    wrapper.connection = mock.MagicMock()
+    return wrapper
+
+
+def sent(wrapper):
+    cursor = wrapper.connection.cursor.return_value.__enter__.return_value
+    return [call.args[0] for call in cursor.execute.call_args_list]
+
+
+class FakeWrapperTestCase(SimpleTestCase):
+
+    def setUp(self):
+        # Earlier tests on a Postgres database leave the context on public
+        for var in (current_schema, current_db_alias):
+            self.addCleanup(var.reset, var.set(None))
+
+
+class TransactionScopedSchemaTestCase(FakeWrapperTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with override_settings(TENANT_SCHEMA_SCOPE="transaction"):
+            self.wrapper = fake_wrapper()
+        self.autocommit = mock.patch.object(self.wrapper, "get_autocommit", return_value=True).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_public_in_autocommit_sends_nothing(self):
+        self.wrapper.sync_schema()
+        self.assertEqual(sent(self.wrapper), [])
+
+    def test_tenant_in_autocommit_is_refused(self):
+        self.wrapper.set_schema("tenant_acme")
+        with self.assertRaises(UnscopedSchemaError):
+            self.wrapper.sync_schema()
+        self.assertEqual(sent(self.wrapper), [])
+
+    def test_set_local_once_per_transaction(self):
+        self.autocommit.return_value = False
+        self.wrapper.set_schema("tenant_acme")
+        self.wrapper.sync_schema()
+        self.wrapper.sync_schema()
+        self.assertEqual(sent(self.wrapper), ['SET LOCAL search_path TO "tenant_acme";'])
+        with mock.patch("django.db.backends.postgresql.base.DatabaseWrapper._commit"):
+            self.wrapper._commit()
+        self.wrapper.sync_schema()
+        self.assertEqual(sent(self.wrapper), ['SET LOCAL search_path TO "tenant_acme";'] * 2)
+
+    def test_session_scope(self):
+        wrapper = fake_wrapper()
+        wrapper.set_schema("tenant_acme")
+        wrapper.sync_schema()
+        self.assertEqual(sent(wrapper), ['SET search_path TO "tenant_acme";'])
+
+
+
+class SchemaSwitchingTestCase(FakeWrapperTestCase):
+
+    def test_switch_is_lazy_and_deduplicated(self):
+        wrapper = fake_wrapper()
+        wrapper.sync_schema()
+        wrapper.set_schema("tenant_acme")
+        wrapper.set_schema("tenant_beta")
+        wrapper.set_schema("tenant_beta")
+        self.assertEqual(len(sent(wrapper)), 1)
+        wrapper.sync_schema()
+        wrapper.sync_schema()
+        self.assertEqual(sent(wrapper), ['SET search_path TO "public";', 'SET search_path TO "tenant_beta";'])
+        self.assertEqual(wrapper.schema_stats, {
+            "switches": 2, "redundant_switches": 1, "skipped_switches": 1, "leaked_switches": 0,
+        })
+
+    def test_context_schema_only_on_its_shard(self):
+        default, shard = fake_wrapper(), fake_wrapper("shard_1")
+        schema_token = current_schema.set("tenant_acme")
+        alias_token = current_db_alias.set("shard_1")
+        try:
+            default.sync_schema()
+            shard.sync_schema()
+        finally:
+            current_schema.reset(schema_token)
+            current_db_alias.reset(alias_token)
+        self.assertEqual(sent(default), ['SET search_path TO "public";'])
+        self.assertEqual(sent(shard), ['SET search_path TO "tenant_acme";'])
+
+    def test_unreleased_schema_is_a_leak(self):
+        wrapper = fake_wrapper()
+        wrapper.set_schema("tenant_acme")
+        wrapper.begin_request()
+        self.assertEqual((wrapper.schema_name, wrapper.schema_stats["leaked_switches"]), ("public", 1))
+        wrapper.release_schema()
+        wrapper.begin_request()
+        self.assertEqual(wrapper.schema_stats["leaked_switches"], 1)
+
+
+class ConnectionPoolTestCase(FakeWrapperTestCase):
+
+    def test_pool_stats(self):
+        wrapper = fake_wrapper()
+        self.assertIsNone(wrapper.pool_stats())
+        pool = mock.Mock(max_size=10)
+        pool.get_stats.return_value = {"pool_size": 8, "pool_available": 3, "requests_num": 4, "requests_wait_ms": 10}
+        with mock.patch.object(DatabaseWrapper, "pool", new_callable=mock.PropertyMock, return_value=pool):
+            stats = wrapper.pool_stats()
+        self.assertEqual((stats["utilisation"], stats["avg_wait_ms"]), (0.5, 2.5))
+        self.assertEqual(stats["pool_size"], 8)
+
+    def test_pool_returns_connections_on_public(self):
+        options = {"pool": {"min_size": 1}}
+        with mock.patch("django.db.backends.postgresql.base.DatabaseWrapper.pool", new_callable=mock.PropertyMock):
+            fake_wrapper(options=options).pool
+        self.assertIs(options["pool"]["reset"], reset_pooled_connection)
+
+        conn = mock.Mock(autocommit=False)
+        reset_pooled_connection(conn)
+        conn.execute.assert_called_once_with('SET search_path TO "public";')
+        conn.commit.assert_called_once_with()
@@ -1,8 +1,39 @@
 from django.contrib import admin
-from .models import Tenants
+from .models import MigrationRun,MigrationRunTenant,PooledSchema,Tenants
+from .provisioning import enqueue_provisioning
 # Register your models here.
 class TenantAdmin(admin.ModelAdmin):
-    readonly_fields=["schema_name","active_at","inactive_at","timestamp","updated"]
-    list_display=['subdomain','owner','schema_name']
+    readonly_fields=["schema_name","db_alias","provisioning_status","provisioning_error","provisioned_at","active_at","inactive_at","timestamp","updated"]
+    list_display=['subdomain','owner','schema_name','db_alias','provisioning_status']
+    list_filter=['provisioning_status']
+    actions=['reprovision']
+
+    @admin.action(description="Re-provision selected tenants")
+    def reprovision(self,request,queryset):
+        ids=list(queryset.exclude(provisioning_status="PROVISIONING").values_list('id',flat=True))
+        Tenants.objects.filter(id__in=ids).update(provisioning_status="PENDING")
+        for tenant_id in ids:
+            enqueue_provisioning(tenant_id)
+        self.message_user(request,f"{len(ids)} tenant(s) queued for provisioning")
 
 admin.site.register(Tenants,TenantAdmin)
+
+class PooledSchemaAdmin(admin.ModelAdmin):
+    list_display=['schema_name','db_alias','created_at']
+    readonly_fields=['schema_name','db_alias','created_at']
+
+admin.site.register(PooledSchema,PooledSchemaAdmin)
+
+class MigrationRunTenantInline(admin.TabularInline):
+    model=MigrationRunTenant
+    fields=['tenant','status','duration','finished_at','error']
+    readonly_fields=fields
+    extra=0
+    can_delete=False
+
+class MigrationRunAdmin(admin.ModelAdmin):
+    list_display=['id','status','jobs','started_at','finished_at']
+    readonly_fields=['status','jobs','started_at','finished_at']
+    inlines=[MigrationRunTenantInline]
+
+admin.site.register(MigrationRun,MigrationRunAdmin)
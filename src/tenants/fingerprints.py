@@ -0,0 +1,98 @@
+import hashlib
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Exists, OuterRef
+from django.db.migrations.recorder import MigrationRecorder
+from helpers.db.schemas import use_public_schema
+from .migrator import expected_migrations, get_migration_loader, with_replacements
+
+FINGERPRINT_TABLE = "tenants_schemafingerprint"
+
+_code_fingerprint = None
+_tenant_code_fingerprint = None
+
+
+def fingerprint(keys):
+    """sha256 over the sorted ``app.name`` migration keys"""
+    digest = hashlib.sha256()
+    for app_label, name in sorted(keys):
+        digest.update(f"{app_label}.{name}\n".encode())
+    return digest.hexdigest()
+
+
+def code_fingerprint():
+    """Fingerprint of every migration in the code; what `migrate` brings public to"""
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        _code_fingerprint = fingerprint(get_migration_loader().graph.nodes)
+    return _code_fingerprint
+
+
+def tenant_code_fingerprint():
+    """Fingerprint of the migrations a tenant schema should have applied"""
+    global _tenant_code_fingerprint
+    if _tenant_code_fingerprint is None:
+        _tenant_code_fingerprint = fingerprint(expected_migrations())
+    return _tenant_code_fingerprint
+
+
+def schema_fingerprint(connection, keys=None):
+    """
+    Fingerprint of the migrations applied to the schema ``connection``
+    currently points at, limited to ``keys`` (default: the whole graph) so
+    rows of deleted migrations don't count.
+    """
+    keys = set(get_migration_loader().graph.nodes) if keys is None else set(keys)
+    applied = with_replacements(MigrationRecorder(connection).applied_migrations())
+    return fingerprint(key for key in applied if key in keys)
+
+
+def fingerprint_table_ready():
+    # Missing on the very first deploy, before tenants' migrations ran
+    with use_public_schema():
+        return FINGERPRINT_TABLE in connections[DEFAULT_DB_ALIAS].introspection.table_names()
+
+
+def get_stored_fingerprint(schema_name, using=DEFAULT_DB_ALIAS):
+    SchemaFingerprint = apps.get_model('tenants', 'SchemaFingerprint')
+    with use_public_schema():
+        return SchemaFingerprint.objects.filter(db_alias=using, schema_name=schema_name).values_list(
+            'fingerprint', flat=True
+        ).first()
+
+
+def store_fingerprint(schema_name, value, using=DEFAULT_DB_ALIAS):
+    SchemaFingerprint = apps.get_model('tenants', 'SchemaFingerprint')
+    with use_public_schema():
+        SchemaFingerprint.objects.update_or_create(
+            db_alias=using, schema_name=schema_name, defaults={'fingerprint': value}
+        )
+
+
+def record_schema_fingerprint(schema_name, using=DEFAULT_DB_ALIAS):
+    """Store the tenant fingerprint of ``schema_name``; the connection must point at it"""
+    store_fingerprint(schema_name, schema_fingerprint(connections[using], expected_migrations()), using)
+
+
+def current_schemas(schema_names, using=DEFAULT_DB_ALIAS):
+    """The subset of ``schema_names`` whose stored fingerprint matches the code (one query)"""
+    SchemaFingerprint = apps.get_model('tenants', 'SchemaFingerprint')
+    with use_public_schema():
+        return set(SchemaFingerprint.objects.filter(
+            db_alias=using, schema_name__in=list(schema_names), fingerprint=tenant_code_fingerprint()
+        ).values_list('schema_name', flat=True))
+
+
+def schema_fingerprint_is_current(schema_name, using=DEFAULT_DB_ALIAS):
+    return get_stored_fingerprint(schema_name, using) == tenant_code_fingerprint()
+
+
+def outdated_tenants():
+    """READY tenants with no fingerprint matching the code, one anti-join"""
+    Tenants = apps.get_model('tenants', 'Tenants')
+    SchemaFingerprint = apps.get_model('tenants', 'SchemaFingerprint')
+    matching = SchemaFingerprint.objects.filter(
+        db_alias=OuterRef('db_alias'), schema_name=OuterRef('schema_name'), fingerprint=tenant_code_fingerprint()
+    )
+    return Tenants.objects.filter(provisioning_status="READY").exclude(Exists(matching))
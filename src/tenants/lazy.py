@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from helpers.db.context import schema_context
+from helpers.db.locks import advisory_lock
+from helpers.db.resolvers import LRUCache
+from helpers.db.schemas import DEFAULT_SCHEMA, does_schema_exists, schema_is_transaction_scoped
+from .fingerprints import schema_fingerprint_is_current, tenant_code_fingerprint
+from .status import schema_is_current
+from .tasks import migrate_schema_task
+
+# "Schema is current" flags: per process first, then the shared cache. The
+# key carries the code fingerprint, so a deploy with new migrations starts
+# from a clean slate without any explicit invalidation.
+_current_schemas = LRUCache(maxsize=4096, ttl=3600)
+
+
+def schema_ok_key(schema_name, using):
+    return f"tenant-schema-ok:{tenant_code_fingerprint()}:{using}:{schema_name}"
+
+
+def ensure_tenant_schema_current(schema_name, using=DEFAULT_DB_ALIAS):
+    """
+    Migrate ``schema_name`` if it is behind the code, at most once per
+    deploy. Concurrent first requests for the same tenant queue on an
+    advisory lock; the rest of the fleet pays one cache lookup. Never
+    migrates with TENANT_SCHEMA_SCOPE = "transaction".
+    """
+    if not schema_name or schema_name == DEFAULT_SCHEMA:
+        return
+    if schema_is_transaction_scoped():
+        # Behind a transaction-mode pooler the session-level advisory lock
+        # and its unlock may reach different server sessions, leaking the
+        # lock; migrations want a direct connection anyway (`migrate_schema`)
+        return
+    key = schema_ok_key(schema_name, using)
+    if _current_schemas.get(key) or cache.get(key):
+        _current_schemas.set(key, True)
+        return
+    if not does_schema_exists(schema_name, using):
+        # Not provisioned yet; that is tenants.provisioning's job
+        return
+    with schema_context(None):
+        # Indexed fingerprint lookup first; introspect django_migrations only
+        # for schemas that have no (or an old) fingerprint.
+        if not schema_fingerprint_is_current(schema_name, using) and not schema_is_current(schema_name, using):
+            with advisory_lock(f"tenant-migrate:{schema_name}", using):
+                if not schema_is_current(schema_name, using):
+                    print(f"Lazily migrating {schema_name} on {using}")
+                    migrate_schema_task(schema_name, using)
+    cache.set(key, True, None)
+    _current_schemas.set(key, True)
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+def place_existing_tenants_on_default(apps, schema_editor):
+    Tenants = apps.get_model('tenants', 'Tenants')
+    Tenants.objects.filter(db_alias='').update(db_alias='default')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_alter_tenants_subdomain'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenants',
+            name='db_alias',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=60),
+        ),
+        migrations.RunPython(place_existing_tenants_on_default, migrations.RunPython.noop),
+    ]
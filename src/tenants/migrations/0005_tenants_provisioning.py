@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:05
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_existing_tenants_ready(apps, schema_editor):
+    # Existing tenants were migrated inline by Tenants.save()
+    Tenants = apps.get_model('tenants', 'Tenants')
+    Tenants.objects.all().update(provisioning_status='READY', provisioned_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0004_pooledschema'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenants',
+            name='provisioning_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('PROVISIONING', 'Provisioning'), ('READY', 'Ready'), ('FAILED', 'Failed')], db_index=True, default='PENDING', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='tenants',
+            name='provisioning_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='tenants',
+            name='provisioned_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_tenants_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0006_migrationrun_migrationruntenant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchemaFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('db_alias', models.CharField(default='default', max_length=60)),
+                ('schema_name', models.CharField(max_length=63)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('db_alias', 'schema_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,105 @@
+import copy
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def get_migration_loader():
+    """
+    The migration graph, read from disk once per process.
+
+    Built without a connection, so it holds no per-schema state: squashed
+    migrations are always in place of the migrations they replace.
+    """
+    global _loader
+    if _loader is None:
+        with _loader_lock:
+            if _loader is None:
+                _loader = MigrationLoader(None, ignore_no_migrations=True)
+    return _loader
+
+
+def reset_migration_loader():
+    global _loader
+    with _loader_lock:
+        _loader = None
+
+
+def with_replacements(applied):
+    """``applied`` keys plus every squashed migration whose targets are all in it"""
+    applied = set(applied)
+    for key, migration in get_migration_loader().replacements.items():
+        if all(target in applied for target in migration.replaces):
+            applied.add(key)
+    return applied
+
+
+def expected_migrations():
+    """Migrations (in plan order) every tenant schema should have applied"""
+    loader = get_migration_loader()
+    customer_labels = {
+        app_config.label for app_config in apps.get_app_configs()
+        if app_config.name in getattr(settings, 'CUSTOMER_INSTALLED_APPS', [])
+    }
+    plan = []
+    for leaf in loader.graph.leaf_nodes():
+        if leaf[0] in customer_labels:
+            for key in loader.graph.forwards_plan(leaf):
+                if key not in plan:
+                    plan.append(key)
+    return plan
+
+
+class TenantMigrationExecutor(MigrationExecutor):
+    """
+    MigrationExecutor on the cached graph. Only the ``django_migrations``
+    rows of the schema behind ``connection`` are read per tenant.
+    """
+
+    def __init__(self, connection, progress_callback=None):
+        self.connection = connection
+        self.recorder = MigrationRecorder(connection)
+        self.progress_callback = progress_callback
+        # Shallow copy: the graph is shared, applied_migrations is ours.
+        self.loader = copy.copy(get_migration_loader())
+        self.loader.connection = connection
+        self.refresh_applied()
+
+    def refresh_applied(self):
+        applied = self.recorder.applied_migrations()
+        # Same rule as MigrationLoader.build_graph: a squashed migration
+        # counts as applied once everything it replaces is.
+        for key, migration in self.loader.replacements.items():
+            if all(target in applied for target in migration.replaces):
+                applied.setdefault(key, migration)
+        self.loader.applied_migrations = applied
+
+    def has_partial_replacements(self):
+        """True when a squashed migration is only partly applied here; the
+        cached graph cannot plan that, only a per-schema graph can."""
+        applied = self.loader.applied_migrations
+        for key, migration in self.loader.replacements.items():
+            done = [target in applied for target in migration.replaces]
+            if any(done) and not all(done):
+                return True
+        return False
+
+    def migrate(self, targets, plan=None, state=None, fake=False, fake_initial=False):
+        state = super().migrate(targets, plan=plan, state=state, fake=fake, fake_initial=fake_initial)
+        self.refresh_applied()
+        return state
+
+
+def get_executor(connection):
+    """Cached-graph executor, or Django's own when the schema needs a full graph"""
+    executor = TenantMigrationExecutor(connection)
+    if executor.has_partial_replacements():
+        return MigrationExecutor(connection)
+    return executor
@@ -1,19 +1,32 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
-from .utils import generate_schema_name
+from .utils import generate_schema_name,choose_tenant_shard
 from helpers.db.validators import validate_blocked_subdomains,validate_subdomain
 from django.core.management import call_command
 import uuid
-from .tasks import migrate_single_tenant_task
+from django.db import transaction
 User=settings.AUTH_USER_MODEL
+
+# Tenant schema lifecycle, driven by tenants.provisioning
+PROVISIONING_CHOICES = (
+    ("PENDING", "Pending"),
+    ("PROVISIONING", "Provisioning"),
+    ("READY", "Ready"),
+    ("FAILED", "Failed"),
+)
 # Create your models here.
 class Tenants(models.Model):
     id = models.UUIDField(default=uuid.uuid4,primary_key=True,db_index=True,editable=False)
     owner=models.ForeignKey(User,on_delete=models.SET_NULL,null=True)
     subdomain=models.CharField(max_length=60,db_index=True,unique=True,validators=[validate_subdomain,validate_blocked_subdomains])
     schema_name=models.CharField(max_length=60,db_index=True,unique=True,blank=True,null=True)
+    # Database alias (shard) holding the tenant schema, see helpers.db.routers
+    db_alias=models.CharField(max_length=60,db_index=True,blank=True,default="")
     active=models.BooleanField(default=True)
+    provisioning_status=models.CharField(max_length=20,choices=PROVISIONING_CHOICES,default="PENDING",db_index=True)
+    provisioning_error=models.TextField(blank=True,default="")
+    provisioned_at=models.DateTimeField(null=True,blank=True)
     active_at=models.DateTimeField(null=True,blank=True)
     inactive_at=models.DateTimeField(null=True,blank=True)
     timestamp=models.DateTimeField(auto_now_add=True)
@@ -29,5 +42,85 @@ class Tenants(models.Model):
             self.active_at=None
         if not self.schema_name:
             self.schema_name=generate_schema_name(self.id)
+        if not self.db_alias:
+            self.db_alias=choose_tenant_shard()
+        adding=self._state.adding
         super().save(*args,**kwargs)
-        migrate_single_tenant_task(self.id)
\ No newline at end of file
+        if adding:
+            # Schema work happens off the request, only for new tenants;
+            # admin edits never touch the schema.
+            from .provisioning import enqueue_provisioning
+            tenant_id=self.id
+            transaction.on_commit(lambda: enqueue_provisioning(tenant_id))
+
+    @property
+    def is_ready(self):
+        return self.provisioning_status=="READY"
+
+
+class PooledSchema(models.Model):
+    """A pre-migrated, unclaimed tenant schema (see tenants.pool)"""
+    schema_name=models.CharField(max_length=60,unique=True)
+    db_alias=models.CharField(max_length=60,db_index=True,default="default")
+    created_at=models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering=["created_at"]
+
+    def __str__(self):
+        return f"{self.schema_name} ({self.db_alias})"
+
+
+MIGRATION_RUN_CHOICES = (
+    ("RUNNING", "Running"),
+    ("COMPLETED", "Completed"),
+    ("FAILED", "Failed"),
+)
+MIGRATION_RUN_TENANT_CHOICES = (
+    ("PENDING", "Pending"),
+    ("OK", "Ok"),
+    ("FAILED", "Failed"),
+)
+
+
+class MigrationRun(models.Model):
+    """One fleet-wide `migrate_schema` pass; resumable by id"""
+    id = models.UUIDField(default=uuid.uuid4,primary_key=True,editable=False)
+    status=models.CharField(max_length=20,choices=MIGRATION_RUN_CHOICES,default="RUNNING")
+    jobs=models.PositiveIntegerField(default=1)
+    started_at=models.DateTimeField(auto_now_add=True)
+    finished_at=models.DateTimeField(null=True,blank=True)
+
+    def __str__(self):
+        return f"{self.id} ({self.status})"
+
+
+class MigrationRunTenant(models.Model):
+    """Checkpoint of one tenant inside a MigrationRun"""
+    run=models.ForeignKey(MigrationRun,on_delete=models.CASCADE,related_name="tenants")
+    tenant=models.ForeignKey(Tenants,on_delete=models.CASCADE)
+    status=models.CharField(max_length=20,choices=MIGRATION_RUN_TENANT_CHOICES,default="PENDING")
+    started_at=models.DateTimeField(null=True,blank=True)
+    finished_at=models.DateTimeField(null=True,blank=True)
+    duration=models.FloatField(null=True,blank=True)
+    error=models.TextField(blank=True,default="")
+
+    class Meta:
+        unique_together=("run","tenant")
+
+
+class SchemaFingerprint(models.Model):
+    """
+    Hash of the migrations applied to one schema (see tenants.fingerprints),
+    so "is this schema current?" is one indexed lookup.
+    """
+    db_alias=models.CharField(max_length=60,default="default")
+    schema_name=models.CharField(max_length=63)
+    fingerprint=models.CharField(max_length=64)
+    updated_at=models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together=("db_alias","schema_name")
+
+    def __str__(self):
+        return f"{self.db_alias}:{self.schema_name} {self.fingerprint[:12]}"
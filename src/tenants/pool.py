@@ -0,0 +1,65 @@
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from helpers.db.schemas import rename_schema, use_public_schema
+from .provisioning import clone_schema, ensure_template_schema, provisioning_mode, template_schema_name
+from .tasks import migrate_schema_task
+
+POOL_SCHEMA_PREFIX = "pool_"
+
+
+def schema_pool_size():
+    return getattr(settings, "TENANT_SCHEMA_POOL_SIZE", 0)
+
+
+def build_pooled_schema(using=DEFAULT_DB_ALIAS):
+    """Provision one anonymous schema and put it in the pool"""
+    PooledSchema = apps.get_model('tenants', 'PooledSchema')
+    schema_name = f"{POOL_SCHEMA_PREFIX}{uuid.uuid4().hex}"
+    if provisioning_mode() == "clone":
+        ensure_template_schema(using)
+        clone_schema(template_schema_name(), schema_name, using)
+    else:
+        migrate_schema_task(schema_name, using)
+    with use_public_schema():
+        return PooledSchema.objects.create(schema_name=schema_name, db_alias=using)
+
+
+def fill_schema_pool(using=DEFAULT_DB_ALIAS, size=None):
+    """Top the pool on ``using`` up to ``size`` schemas; returns how many were built"""
+    PooledSchema = apps.get_model('tenants', 'PooledSchema')
+    size = schema_pool_size() if size is None else size
+    with use_public_schema():
+        missing = size - PooledSchema.objects.filter(db_alias=using).count()
+    for _ in range(max(missing, 0)):
+        build_pooled_schema(using)
+    return max(missing, 0)
+
+
+def claim_pooled_schema(schema_name, using=DEFAULT_DB_ALIAS):
+    """
+    Take a pooled schema on ``using`` and rename it to ``schema_name``.
+
+    SKIP LOCKED lets concurrent signups each grab a different row without
+    waiting on one another. Returns False when the pool is empty.
+
+    The rename runs in a transaction on the shard and the row delete in one
+    on the primary (the same one when the shard is the primary). The
+    primary commits first: should the shard commit fail after it, the pool
+    merely loses a schema, whereas the other order could leave a row
+    pointing at a schema that was already renamed away. The stored
+    fingerprint follows the schema to its new name.
+    """
+    PooledSchema = apps.get_model('tenants', 'PooledSchema')
+    SchemaFingerprint = apps.get_model('tenants', 'SchemaFingerprint')
+    with use_public_schema(), transaction.atomic(using=using), transaction.atomic(using=DEFAULT_DB_ALIAS):
+        pooled = PooledSchema.objects.select_for_update(skip_locked=True).filter(db_alias=using).first()
+        if pooled is None:
+            return False
+        rename_schema(pooled.schema_name, schema_name, using)
+        SchemaFingerprint.objects.filter(db_alias=using, schema_name=schema_name).delete()
+        SchemaFingerprint.objects.filter(db_alias=using, schema_name=pooled.schema_name).update(schema_name=schema_name)
+        pooled.delete()
+    return True
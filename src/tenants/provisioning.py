@@ -0,0 +1,265 @@
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from helpers.db.catalog import list_schema_tables, qualified_name, reset_sequences
+from helpers.db.locks import advisory_lock
+from helpers.db.registry import schema_registry
+from helpers.db.schemas import does_schema_exists, use_public_schema
+from helpers.db.statements import CREATE_SCHEMA_SQL
+from .status import schema_is_current, tenant_migration_status
+from .tasks import migrate_schema_task, migrate_single_tenant_task
+
+CONSTRAINTS_SQL = """
+    SELECT cl.relname, con.conname, pg_get_constraintdef(con.oid)
+    FROM pg_catalog.pg_constraint con
+    JOIN pg_catalog.pg_class cl ON cl.oid = con.conrelid
+    JOIN pg_catalog.pg_namespace n ON n.oid = cl.relnamespace
+    WHERE n.nspname = %s AND con.contype = ANY(%s) AND con.conparentid = 0
+"""
+# Indexes that do not back a constraint; pg_get_indexdef always qualifies the table
+INDEXES_SQL = """
+    SELECT pg_get_indexdef(i.indexrelid), quote_ident(n.nspname)
+    FROM pg_catalog.pg_index i
+    JOIN pg_catalog.pg_class cl ON cl.oid = i.indrelid
+    JOIN pg_catalog.pg_namespace n ON n.oid = cl.relnamespace
+    WHERE n.nspname = %s AND NOT cl.relispartition
+      AND NOT EXISTS (SELECT 1 FROM pg_catalog.pg_constraint con WHERE con.conindid = i.indexrelid)
+"""
+# Plain serial columns copied by LIKE still point at the template's sequence
+SERIAL_DEFAULTS_SQL = """
+    SELECT cl.relname, a.attname
+    FROM pg_catalog.pg_attrdef d
+    JOIN pg_catalog.pg_attribute a ON a.attrelid = d.adrelid AND a.attnum = d.adnum
+    JOIN pg_catalog.pg_class cl ON cl.oid = d.adrelid
+    JOIN pg_catalog.pg_namespace n ON n.oid = cl.relnamespace
+    WHERE n.nspname = %s AND NOT cl.relispartition AND pg_get_expr(d.adbin, d.adrelid) LIKE 'nextval(%%'
+"""
+# Partitioned tables: the key to re-declare and every partition with its bounds
+PARTITION_KEYS_SQL = """
+    SELECT cl.relname, pg_get_partkeydef(cl.oid)
+    FROM pg_catalog.pg_class cl
+    JOIN pg_catalog.pg_namespace n ON n.oid = cl.relnamespace
+    WHERE n.nspname = %s AND cl.relkind = 'p' AND NOT cl.relispartition
+"""
+PARTITIONS_SQL = """
+    SELECT parent.relname, cl.relname, pg_get_expr(cl.relpartbound, cl.oid)
+    FROM pg_catalog.pg_inherits i
+    JOIN pg_catalog.pg_class cl ON cl.oid = i.inhrelid
+    JOIN pg_catalog.pg_class parent ON parent.oid = i.inhparent
+    JOIN pg_catalog.pg_namespace n ON n.oid = parent.relnamespace
+    WHERE n.nspname = %s AND parent.relkind = 'p'
+    ORDER BY parent.relname, cl.relname
+"""
+
+
+def provisioning_mode():
+    return getattr(settings, "TENANT_PROVISIONING_MODE", "migrate")
+
+
+def template_schema_name():
+    return getattr(settings, "TENANT_TEMPLATE_SCHEMA", "tenant_template")
+
+
+def template_is_current(using=DEFAULT_DB_ALIAS):
+    return schema_is_current(template_schema_name(), using)
+
+
+def ensure_template_schema(using=DEFAULT_DB_ALIAS):
+    """Create/migrate the template schema on ``using``; serialised across processes"""
+    if template_is_current(using):
+        return
+    template = template_schema_name()
+    with advisory_lock(template, using):
+        if not template_is_current(using):
+            migrate_schema_task(template, using)
+
+
+def clone_schema(source, target, using=DEFAULT_DB_ALIAS):
+    """
+    Copy schema ``source`` to a new schema ``target`` in one transaction.
+
+    Tables come over with ``LIKE ... INCLUDING ALL EXCLUDING INDEXES``
+    (columns, defaults, identity sequences, check constraints) and rows -
+    django_migrations included - with INSERT ... SELECT. Keys, indexes and
+    foreign keys are then replayed from the catalog under their original
+    names, since later migrations drop them by name. Partitioned tables
+    keep their partition key and get the same partitions (the keys and
+    indexes declared on the parent cascade to them). Sequences end up past
+    the copied rows.
+    """
+    conn = connections[using]
+    quote = conn.ops.quote_name
+    tables = list_schema_tables(using, source)
+    with transaction.atomic(using=using), conn.cursor() as cursor:
+        cursor.execute(CREATE_SCHEMA_SQL.format(schema_name=target))
+        cursor.execute(PARTITION_KEYS_SQL, [source])
+        partition_keys = dict(cursor.fetchall())
+        for table in tables:
+            partition_by = f" PARTITION BY {partition_keys[table]}" if table in partition_keys else ""
+            cursor.execute(
+                f"CREATE TABLE {qualified_name(using, target, table)} "
+                f"(LIKE {qualified_name(using, source, table)} INCLUDING ALL EXCLUDING INDEXES){partition_by}"
+            )
+
+        cursor.execute(SERIAL_DEFAULTS_SQL, [target])
+        for table, column in cursor.fetchall():
+            sequence = qualified_name(using, target, f"{table}_{column}_seq")
+            cursor.execute(f"CREATE SEQUENCE {sequence} OWNED BY {qualified_name(using, target, table)}.{quote(column)}")
+            cursor.execute(
+                f"ALTER TABLE {qualified_name(using, target, table)} "
+                f"ALTER COLUMN {quote(column)} SET DEFAULT nextval('{sequence}'::regclass)"
+            )
+
+        # After the default fix-up so partitions inherit the clone's sequences
+        cursor.execute(PARTITIONS_SQL, [source])
+        for parent, partition, bound in cursor.fetchall():
+            cursor.execute(
+                f"CREATE TABLE {qualified_name(using, target, partition)} "
+                f"PARTITION OF {qualified_name(using, target, parent)} {bound}"
+            )
+
+        for table in tables:
+            cursor.execute(
+                f"INSERT INTO {qualified_name(using, target, table)} OVERRIDING SYSTEM VALUE "
+                f"SELECT * FROM {qualified_name(using, source, table)}"
+            )
+
+        # pg_get_constraintdef leaves tables on the search_path unqualified:
+        # read the definitions from the template, replay them in the clone.
+        cursor.execute(f"SET LOCAL search_path TO {quote(source)}")
+        cursor.execute(CONSTRAINTS_SQL, [source, ["p", "u", "x"]])
+        keys = cursor.fetchall()
+        cursor.execute(CONSTRAINTS_SQL, [source, ["f"]])
+        foreign_keys = cursor.fetchall()
+        cursor.execute(INDEXES_SQL, [source])
+        indexes = cursor.fetchall()
+        cursor.execute(f"SET LOCAL search_path TO {quote(target)}")
+        for table, name, definition in keys:
+            cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}")
+        for definition, source_prefix in indexes:
+            definition = definition.replace(f" ON {source_prefix}.", f" ON {quote(target)}.", 1)
+            # ON ONLY marks a partitioned parent's index; build it on the partitions too
+            definition = definition.replace(f" ON ONLY {source_prefix}.", f" ON {quote(target)}.", 1)
+            cursor.execute(definition)
+        for table, name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}")
+
+        reset_sequences(cursor, using, target, tables)
+    schema_registry.add(target, conn)
+    print(f"Cloned schema: {source} -> {target}")
+
+
+def provision_tenant_schema(tenant):
+    """
+    Bring the tenant schema up. A missing schema is taken from the warm
+    pool when there is one, else cloned from the template in "clone" mode
+    (constant time, whatever the number of migrations). The migrate pass
+    that follows only applies what the pool/template was missing.
+    """
+    from .pool import claim_pooled_schema, schema_pool_size
+
+    using = tenant.db_alias or DEFAULT_DB_ALIAS
+    if not does_schema_exists(tenant.schema_name, using):
+        if schema_pool_size() and claim_pooled_schema(tenant.schema_name, using):
+            pass
+        elif provisioning_mode() == "clone":
+            ensure_template_schema(using)
+            clone_schema(template_schema_name(), tenant.schema_name, using)
+    migrate_single_tenant_task(tenant.id)
+
+
+def provisioning_lock_name(tenant_id):
+    return f"tenant-provision:{tenant_id}"
+
+
+def provision_tenant(tenant_id, force=False):
+    """
+    PENDING/FAILED -> PROVISIONING -> READY or FAILED.
+
+    The conditional UPDATE is the claim: two workers racing on one tenant
+    cannot both win it. ``force`` also re-runs READY tenants. The worker
+    holds an advisory lock on the tenant for the whole run, which is how
+    requeue_stale_provisioning tells a slow worker from a dead one.
+    """
+    Tenants = apps.get_model('tenants', 'Tenants')
+    statuses = ["PENDING", "FAILED"] + (["READY"] if force else [])
+    with use_public_schema():
+        claimed = Tenants.objects.filter(id=tenant_id, provisioning_status__in=statuses).update(
+            provisioning_status="PROVISIONING", provisioning_error="", updated=timezone.now()
+        )
+        if not claimed:
+            return False
+        tenant = Tenants.objects.get(id=tenant_id)
+    try:
+        with advisory_lock(provisioning_lock_name(tenant_id)):
+            provision_tenant_schema(tenant)
+    except Exception as e:
+        print(f"Provisioning tenant {tenant_id} failed: {e}")
+        with use_public_schema():
+            Tenants.objects.filter(id=tenant_id).update(
+                provisioning_status="FAILED", provisioning_error=f"{type(e).__name__}: {e}", updated=timezone.now()
+            )
+        return False
+    with use_public_schema():
+        Tenants.objects.filter(id=tenant_id).update(
+            provisioning_status="READY", provisioned_at=timezone.now(), updated=timezone.now()
+        )
+    return True
+
+
+def _provision_in_thread(tenant_id):
+    try:
+        provision_tenant(tenant_id)
+    finally:
+        # Thread-local connections would otherwise stay open until GC
+        connections.close_all()
+
+
+def enqueue_provisioning(tenant_id):
+    """
+    Hand a PENDING tenant to a background thread of this process when
+    TENANT_PROVISION_IN_PROCESS is on (single-process setups). Otherwise,
+    the default, the row waits for the ``provision_tenants`` worker.
+    """
+    if getattr(settings, "TENANT_PROVISION_IN_PROCESS", False):
+        threading.Thread(target=_provision_in_thread, args=(tenant_id,), daemon=True).start()
+
+
+def requeue_stale_provisioning(older_than):
+    """
+    PROVISIONING rows whose worker died go back to PENDING. A row qualifies
+    once it is older than ``older_than`` and nobody holds its provisioning
+    lock; a long migration keeps the lock and is left alone.
+    """
+    Tenants = apps.get_model('tenants', 'Tenants')
+    with use_public_schema():
+        stale = list(Tenants.objects.filter(
+            provisioning_status="PROVISIONING", updated__lt=timezone.now() - older_than
+        ).values_list('id', flat=True))
+    requeued = 0
+    for tenant_id in stale:
+        with advisory_lock(provisioning_lock_name(tenant_id), wait=False) as free:
+            if not free:
+                continue
+            with use_public_schema():
+                requeued += Tenants.objects.filter(id=tenant_id, provisioning_status="PROVISIONING").update(
+                    provisioning_status="PENDING", updated=timezone.now()
+                )
+    return requeued
+
+
+def requeue_outdated_tenants():
+    """READY tenants whose schema is missing or behind the code go back to PENDING"""
+    Tenants = apps.get_model('tenants', 'Tenants')
+    with use_public_schema():
+        ready = list(Tenants.objects.filter(provisioning_status="READY"))
+    outdated = [row["id"] for row in tenant_migration_status(ready) if not row["up_to_date"]]
+    if not outdated:
+        return 0
+    with use_public_schema():
+        return Tenants.objects.filter(id__in=outdated, provisioning_status="READY").update(
+            provisioning_status="PENDING", updated=timezone.now()
+        )
@@ -0,0 +1,121 @@
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from helpers.db.catalog import list_schema_tables, qualified_name, raw_connection, reset_sequences, table_columns
+from helpers.db.resolvers import tenant_resolver
+from helpers.db.schemas import drop_schema, use_public_schema
+from .tasks import migrate_single_tenant_task
+
+
+class RelocationError(Exception):
+    pass
+
+
+def copy_tables(schema_name, tables, source, target, replace="truncate"):
+    """
+    Stream ``tables`` from ``source`` to ``target`` with binary COPY.
+
+    The source is read from a single REPEATABLE READ snapshot and the target
+    is written in one transaction, so deferred foreign keys (Django creates
+    them DEFERRABLE INITIALLY DEFERRED) are only checked once every table
+    has landed.
+    """
+    quote = connections[target].ops.quote_name
+    src, dst = raw_connection(source), raw_connection(target)
+    with src.transaction(), dst.transaction():
+        with src.cursor() as src_cursor, dst.cursor() as dst_cursor:
+            src_cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            if replace == "truncate":
+                dst_cursor.execute(
+                    "TRUNCATE " + ", ".join(qualified_name(target, schema_name, t) for t in tables)
+                )
+            for table in tables:
+                columns = ", ".join(quote(name) for name, _ in table_columns(source, schema_name, table))
+                qualified = qualified_name(source, schema_name, table)
+                if replace == "delete":
+                    dst_cursor.execute(f"DELETE FROM {qualified}")
+                with src_cursor.copy(f"COPY (SELECT {columns} FROM {qualified}) TO STDOUT (FORMAT BINARY)") as copy_out:
+                    with dst_cursor.copy(f"COPY {qualified} ({columns}) FROM STDIN (FORMAT BINARY)") as copy_in:
+                        for data in copy_out:
+                            copy_in.write(data)
+            reset_sequences(dst_cursor, target, schema_name, tables)
+
+
+def table_checksums(using, schema_name, tables):
+    """{table: (row_count, md5)} computed over each row's text form"""
+    quote = connections[using].ops.quote_name
+    checksums = {}
+    with raw_connection(using).cursor() as cursor:
+        for table in tables:
+            columns = ", ".join(quote(name) for name, _ in table_columns(using, schema_name, table))
+            cursor.execute(
+                "SELECT count(*), md5(COALESCE(string_agg(h, '' ORDER BY h), '')) "
+                f"FROM (SELECT md5(t::text) AS h FROM (SELECT {columns} FROM {qualified_name(using, schema_name, table)}) t) rows"
+            )
+            checksums[table] = cursor.fetchone()
+    return checksums
+
+
+def relocate_tenant(subdomain, target, drain_seconds=5, drop_source=False, stdout=print):
+    """
+    Move one tenant schema to another database alias.
+
+    1. migrate an empty copy of the schema on ``target``
+    2. bulk copy every table while the tenant stays online
+    3. fence writes through the resolver and let in-flight requests drain
+    4. re-copy only the tables whose checksum moved, then verify all of them
+    5. flip ``Tenants.db_alias`` and lift the fence once every worker's
+       L1 entry has expired
+    """
+    Tenants = apps.get_model('tenants', 'Tenants')
+    if target not in settings.DATABASES:
+        raise RelocationError(f"Unknown database alias '{target}'")
+    with use_public_schema():
+        tenant = Tenants.objects.get(subdomain=subdomain)
+    source = tenant.db_alias or DEFAULT_DB_ALIAS
+    schema_name = tenant.schema_name
+    if source == target:
+        raise RelocationError(f"'{subdomain}' already lives on '{target}'")
+
+    stdout(f"Preparing {schema_name} on {target}")
+    migrate_single_tenant_task(tenant.id, using=target)
+    tables = list_schema_tables(source, schema_name)
+
+    stdout(f"Copying {len(tables)} tables from {source} (tenant still online)")
+    started = time.monotonic()
+    copy_tables(schema_name, tables, source, target, replace="truncate")
+    stdout(f"  bulk copy took {time.monotonic() - started:.1f}s")
+
+    fence_ttl = drain_seconds + tenant_resolver.l1.ttl + 300
+    tenant_resolver.fence(subdomain, fence_ttl)
+    try:
+        stdout(f"Writes fenced, draining for {drain_seconds}s")
+        time.sleep(drain_seconds)
+
+        source_sums = table_checksums(source, schema_name, tables)
+        target_sums = table_checksums(target, schema_name, tables)
+        changed = [t for t in tables if source_sums[t] != target_sums[t]]
+        if changed:
+            stdout(f"Catching up {len(changed)} changed tables: {', '.join(changed)}")
+            copy_tables(schema_name, changed, source, target, replace="delete")
+            target_sums.update(table_checksums(target, schema_name, changed))
+
+        mismatched = [t for t in tables if source_sums[t] != target_sums[t]]
+        if mismatched:
+            raise RelocationError(f"Checksum mismatch after copy: {', '.join(mismatched)}")
+        stdout(f"Verified row counts and checksums of {len(tables)} tables")
+
+        with use_public_schema():
+            Tenants.objects.filter(pk=tenant.pk).update(db_alias=target)
+        tenant_resolver.invalidate(subdomain, schema_name=schema_name)
+        stdout(f"Placement flipped to {target}, waiting {tenant_resolver.l1.ttl}s for worker caches")
+        # Other workers may still route to the source until their L1 expires.
+        time.sleep(tenant_resolver.l1.ttl)
+    finally:
+        tenant_resolver.unfence(subdomain)
+
+    if drop_source:
+        drop_schema(schema_name, source)
+    return tables
@@ -0,0 +1,80 @@
+import hashlib
+import math
+
+from django.conf import settings
+
+
+class RolloutHalted(Exception):
+    pass
+
+
+class RolloutPolicy:
+    """
+    Canary first, then batches that grow by ``growth`` up to ``max_batch``,
+    with ``pause`` seconds in between.
+
+    The canary is every tenant in ``canary_subdomains`` plus a stable
+    ``canary_percent`` sample (hashed on the tenant id, so a rerun picks the
+    same tenants). The rollout stops after a batch in which a tenant took
+    longer than ``max_seconds`` or the error rate passed ``max_error_rate``;
+    any failure in the canary stops it.
+    """
+
+    def __init__(self, canary_subdomains=(), canary_percent=1.0, first_batch=10, growth=2.0,
+                 max_batch=500, pause=30, max_seconds=None, max_error_rate=0.05):
+        self.canary_subdomains = set(canary_subdomains)
+        self.canary_percent = canary_percent
+        self.first_batch = max(first_batch, 1)
+        self.growth = max(growth, 1.0)
+        self.max_batch = max(max_batch, self.first_batch)
+        self.pause = pause
+        self.max_seconds = max_seconds
+        self.max_error_rate = max_error_rate
+
+    @classmethod
+    def from_settings(cls, **overrides):
+        options = {
+            "canary_subdomains": getattr(settings, "TENANT_CANARY_SUBDOMAINS", []),
+            "canary_percent": getattr(settings, "TENANT_CANARY_PERCENT", 1.0),
+            "first_batch": getattr(settings, "TENANT_ROLLOUT_FIRST_BATCH", 10),
+            "growth": getattr(settings, "TENANT_ROLLOUT_GROWTH", 2.0),
+            "max_batch": getattr(settings, "TENANT_ROLLOUT_MAX_BATCH", 500),
+            "pause": getattr(settings, "TENANT_ROLLOUT_PAUSE", 30),
+            "max_seconds": getattr(settings, "TENANT_ROLLOUT_MAX_SECONDS", None),
+            "max_error_rate": getattr(settings, "TENANT_ROLLOUT_MAX_ERROR_RATE", 0.05),
+        }
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**options)
+
+    def _sample_key(self, tenant):
+        return hashlib.blake2b(str(tenant.id).encode(), digest_size=8).digest()
+
+    def batches(self, tenants):
+        """[("canary", tenants), ("batch", tenants), ...] in rollout order"""
+        tenants = list(tenants)
+        canary = [t for t in tenants if t.subdomain in self.canary_subdomains]
+        rest = sorted((t for t in tenants if t.subdomain not in self.canary_subdomains), key=self._sample_key)
+        sampled = math.ceil(len(rest) * self.canary_percent / 100) if self.canary_percent > 0 else 0
+        canary, rest = canary + rest[:sampled], rest[sampled:]
+
+        batches = [("canary", canary)] if canary else []
+        size = self.first_batch
+        while rest:
+            batches.append(("batch", rest[:size]))
+            rest = rest[size:]
+            size = min(math.ceil(size * self.growth), self.max_batch)
+        return batches
+
+    def check(self, batch_results, is_canary=False):
+        """Raise RolloutHalted if the batch just run breaches a threshold"""
+        if not batch_results:
+            return
+        errors = [r for r in batch_results if r[2]]
+        if is_canary and errors:
+            raise RolloutHalted(f"{len(errors)} canary tenant(s) failed")
+        error_rate = len(errors) / len(batch_results)
+        if self.max_error_rate is not None and error_rate > self.max_error_rate:
+            raise RolloutHalted(f"error rate {error_rate:.0%} above {self.max_error_rate:.0%}")
+        slowest = max(r[1] for r in batch_results)
+        if self.max_seconds and slowest > self.max_seconds:
+            raise RolloutHalted(f"a tenant took {slowest:.1f}s (limit {self.max_seconds}s)")
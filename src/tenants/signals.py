@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from helpers.db.resolvers import tenant_resolver
+from .models import Tenants
+
+
+def _invalidate(*subdomains, schema_name=None, removed=()):
+    for subdomain in subdomains:
+        tenant_resolver.invalidate(subdomain, schema_name=schema_name, removed=subdomain in removed)
+
+
+@receiver(pre_save, sender=Tenants)
+def remember_previous_subdomain(sender, instance, **kwargs):
+    """Keep the old subdomain around so a rename evicts the stale entry too"""
+    instance._previous_subdomain = None
+    if not instance._state.adding:
+        instance._previous_subdomain = (
+            Tenants.objects.filter(pk=instance.pk).values_list('subdomain', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Tenants)
+def invalidate_tenant_on_save(sender, instance, created=False, **kwargs):
+    previous = getattr(instance, '_previous_subdomain', None)
+    subdomains = {instance.subdomain, previous} - {None}
+    # Only a rename takes a name away; the Bloom filters keep the rest
+    removed = {previous} - {instance.subdomain, None}
+    schema_name = instance.schema_name
+    _invalidate(*subdomains, schema_name=schema_name, removed=removed)
+    # Evict again once the row is visible to other connections, otherwise a
+    # concurrent request could re-populate the cache with the old values.
+    transaction.on_commit(lambda: _invalidate(*subdomains, schema_name=schema_name, removed=removed))
+    if created or removed:
+        subdomain = instance.subdomain
+        transaction.on_commit(lambda: tenant_resolver.publish_subdomain(subdomain))
+
+
+@receiver(post_delete, sender=Tenants)
+def invalidate_tenant_on_delete(sender, instance, **kwargs):
+    removed = {instance.subdomain}
+    _invalidate(instance.subdomain, schema_name=instance.schema_name, removed=removed)
+    transaction.on_commit(lambda: _invalidate(instance.subdomain, schema_name=instance.schema_name, removed=removed))
@@ -0,0 +1,92 @@
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connections
+from helpers.db.schemas import use_public_schema
+from .fingerprints import current_schemas
+from .migrator import expected_migrations, with_replacements
+
+# Schemas per UNION ALL statement; keeps the statement size sane on big fleets
+SCAN_BATCH_SIZE = 500
+
+MIGRATION_TABLES_SQL = """
+    SELECT n.nspname
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.relname = 'django_migrations' AND c.relkind IN ('r', 'p') AND n.nspname = ANY(%s)
+"""
+
+
+def applied_migrations_by_schema(schema_names, using=DEFAULT_DB_ALIAS):
+    """
+    {schema_name: {(app, name), ...}} read with one UNION ALL per batch.
+    Schemas without a django_migrations table are left out.
+    """
+    conn = connections[using]
+    quote = conn.ops.quote_name
+    applied = {}
+    with conn.cursor() as cursor:
+        cursor.execute(MIGRATION_TABLES_SQL, [list(schema_names)])
+        existing = [row[0] for row in cursor.fetchall()]
+        for start in range(0, len(existing), SCAN_BATCH_SIZE):
+            batch = existing[start:start + SCAN_BATCH_SIZE]
+            sql = " UNION ALL ".join(
+                f"SELECT %s, app, name FROM {quote(schema_name)}.django_migrations" for schema_name in batch
+            )
+            cursor.execute(sql, batch)
+            for schema_name in batch:
+                applied.setdefault(schema_name, set())
+            for schema_name, app, name in cursor.fetchall():
+                applied[schema_name].add((app, name))
+    return applied
+
+
+def schema_is_current(schema_name, using=DEFAULT_DB_ALIAS):
+    """True when ``schema_name`` has every expected migration applied"""
+    applied = applied_migrations_by_schema([schema_name], using=using).get(schema_name)
+    if applied is None:
+        return False
+    applied = with_replacements(applied)
+    return all(key in applied for key in expected_migrations())
+
+
+def tenant_migration_status(tenants=None, trust_fingerprints=True):
+    """
+    One row per tenant: schema, shard, pending migrations and whether it is
+    up to date. ``tenants`` defaults to every Tenants row.
+
+    Schemas whose stored fingerprint matches the code are taken as current
+    without reading their django_migrations; ``trust_fingerprints=False``
+    scans every schema.
+    """
+    Tenants = apps.get_model('tenants', 'Tenants')
+    if tenants is None:
+        with use_public_schema():
+            tenants = list(Tenants.objects.all())
+    plan = expected_migrations()
+
+    by_alias = {}
+    for tenant in tenants:
+        by_alias.setdefault(tenant.db_alias or DEFAULT_DB_ALIAS, []).append(tenant)
+
+    rows = []
+    for using, group in by_alias.items():
+        current = current_schemas([t.schema_name for t in group], using) if trust_fingerprints else set()
+        applied = applied_migrations_by_schema([t.schema_name for t in group if t.schema_name not in current], using=using)
+        for tenant in group:
+            schema_applied = applied.get(tenant.schema_name)
+            if tenant.schema_name in current:
+                schema_applied, pending = set(plan), []
+            elif schema_applied is None:
+                pending = plan
+            else:
+                schema_applied = with_replacements(schema_applied)
+                pending = [key for key in plan if key not in schema_applied]
+            rows.append({
+                "id": str(tenant.id),
+                "subdomain": tenant.subdomain,
+                "schema_name": tenant.schema_name,
+                "db_alias": using,
+                "initialized": schema_applied is not None,
+                "pending": [f"{app}.{name}" for app, name in pending],
+                "up_to_date": not pending,
+            })
+    return rows
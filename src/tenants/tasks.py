@@ -1,29 +1,42 @@
+import time
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import Any
 from django.core.management import call_command
-from django.db import connection
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.conf import settings
 from django.apps import apps
-from django.db.migrations.executor import MigrationExecutor
+from django.utils import timezone
 from helpers.db.schemas import use_public_schema,use_tenant_schema
+from .fingerprints import record_schema_fingerprint
+from .migrator import TenantMigrationExecutor,get_executor,get_migration_loader
+from .rollout import RolloutHalted
+from .status import tenant_migration_status
 
 def migrate_public_schema_task():
     with use_public_schema():
         call_command("migrate", interactive=False)
 
-def migrate_single_tenant_task(tenant_id:str):
+def migrate_single_tenant_task(tenant_id:str,using=None):
     Tenants=apps.get_model('tenants','Tenants')
     try:
         instance=Tenants.objects.get(id=tenant_id)
     except Exception as e:
         print(f'Exception while migrating tenant : {tenant_id} and exception is {e}')
     schema_name=instance.schema_name
-    with use_tenant_schema(schema_name=schema_name,create_if_missing=True,revert_public=True):
+    # ``using`` overrides the placement, e.g. to prepare a shard relocation
+    using=using or instance.db_alias or DEFAULT_DB_ALIAS
+    migrate_schema_task(schema_name,using)
+
+def migrate_schema_task(schema_name,using=DEFAULT_DB_ALIAS):
+    """Apply the CUSTOMER_INSTALLED_APPS migrations to one schema"""
+    with use_tenant_schema(schema_name=schema_name,create_if_missing=True,revert_public=True,using=using):
             
             print("now going to execute migrations")
-            # Initialize the executor after setting the search path
-            executor = MigrationExecutor(connection)
+            # Initialize the executor after setting the search path; the
+            # graph is cached per process, only this schema's rows are read
+            executor = get_executor(connections[using])
             loader = executor.loader
-            loader.build_graph()  # Ensure the graph is up-to-date
 
             customer_apps = getattr(settings, 'CUSTOMER_INSTALLED_APPS', [])
             customer_app_configs = [
@@ -74,24 +87,177 @@ def migrate_single_tenant_task(tenant_id:str):
                 # Apply the migrations
                 # The plan to migrate is the leaf_nodes for this app
                 executor.migrate(leaf_nodes)
-                # Rebuild the graph after applying migrations
-                executor.loader.build_graph()
+                if not isinstance(executor, TenantMigrationExecutor):
+                    # Rebuild the graph after applying migrations
+                    executor.loader.build_graph()
 
+            # Readiness checks compare this against the code, see tenants.fingerprints
+            record_schema_fingerprint(schema_name,using)
             print("All migrations for CUSTOMER_APPS are completed.")
 
 
 
-def migrate_all_tenant_schema_task():
+def migrate_tenant_timed(tenant_id):
+    """Run one tenant and return (tenant_id, seconds, error or None); never raises"""
+    started=time.monotonic()
+    try:
+        migrate_single_tenant_task(tenant_id)
+    except Exception as e:
+        return tenant_id,time.monotonic()-started,f"{type(e).__name__}: {e}"
+    return tenant_id,time.monotonic()-started,None
+
+
+def _close_db_connections():
+    # Sockets and psycopg pools must never be shared across a fork.
+    for conn in connections.all(initialized_only=True):
+        conn.close()
+        if hasattr(conn,'close_pool'):
+            conn.close_pool()
+
+
+def _init_migration_worker():
+    import django
+    if not apps.ready:
+        # spawn/forkserver start methods get a fresh interpreter
+        django.setup()
+    _close_db_connections()
+
+
+def _format_duration(seconds):
+    minutes,seconds=divmod(int(seconds),60)
+    hours,minutes=divmod(minutes,60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def start_migration_run(tenant_ids,jobs=1):
+    """New MigrationRun with a PENDING checkpoint per tenant"""
+    MigrationRun=apps.get_model('tenants','MigrationRun')
+    MigrationRunTenant=apps.get_model('tenants','MigrationRunTenant')
+    with use_public_schema():
+        run=MigrationRun.objects.create(jobs=jobs)
+        MigrationRunTenant.objects.bulk_create(
+            [MigrationRunTenant(run=run,tenant_id=tenant_id) for tenant_id in tenant_ids],
+            batch_size=1000,
+        )
+    return run
+
+
+def record_migration_checkpoint(run,tenant_id,seconds,error):
+    MigrationRunTenant=apps.get_model('tenants','MigrationRunTenant')
+    finished=timezone.now()
+    with use_public_schema():
+        MigrationRunTenant.objects.filter(run=run,tenant_id=tenant_id).update(
+            status="FAILED" if error else "OK",
+            started_at=finished-timedelta(seconds=seconds),
+            finished_at=finished,
+            duration=seconds,
+            error=error or "",
+        )
+
+
+def migrate_all_tenant_schema_task(jobs=1,report=print,force=False,resume=None,rollout=None):
+    """
+    Migrate public, then every tenant. With ``jobs`` > 1 tenants run in a
+    process pool, each worker holding its own database connections.
+    Tenants already up to date are skipped unless ``force``.
+
+    Every tenant outcome is checkpointed in a MigrationRun; ``resume`` (a
+    run id) retries only the tenants of that run that failed or were never
+    reached. A ``rollout`` (tenants.rollout.RolloutPolicy) runs a canary and
+    growing batches and halts on its thresholds; the rest stays resumable.
+    Returns a summary dict; failures are reported, not raised.
+    """
     Tenant=apps.get_model('tenants','Tenants')
+    MigrationRun=apps.get_model('tenants','MigrationRun')
     qs = Tenant.objects.none()
 
     with use_public_schema():
-        qs = Tenant.objects.all().values_list('id',flat=True)
         call_command("migrate", interactive=False)
+        if resume:
+            run=MigrationRun.objects.get(id=resume)
+            qs=list(Tenant.objects.filter(id__in=run.tenants.exclude(status="OK").values('tenant_id')))
+            run.status="RUNNING"
+            run.finished_at=None
+            run.save(update_fields=["status","finished_at"])
+            report(f"Resuming run {run.id}: {len(qs)} tenant(s) left")
+        else:
+            qs = list(Tenant.objects.all())
+
+    if not resume:
+        total=len(qs)
+        if not force:
+            # One UNION ALL per shard instead of an executor per tenant
+            behind={row["id"] for row in tenant_migration_status(qs) if not row["up_to_date"]}
+            qs=[tenant for tenant in qs if str(tenant.id) in behind]
+            report(f"{total-len(qs)} of {total} tenants already up to date")
+        run=start_migration_run([tenant.id for tenant in qs],jobs)
+        report(f"Started run {run.id} (resume with --resume {run.id})")
+
+    started=time.monotonic()
+    results=[]
+    def record(result):
+        tenant_id,seconds,error=result
+        results.append(result)
+        record_migration_checkpoint(run,tenant_id,seconds,error)
+        status="FAILED" if error else "ok"
+        # ETA from the wall-clock rate so far, which already reflects ``jobs``
+        elapsed=time.monotonic()-started
+        eta=elapsed/len(results)*(len(qs)-len(results))
+        report(
+            f"[{len(results)}/{len(qs)}] tenant {tenant_id} {status} in {seconds:.2f}s, ETA {_format_duration(eta)}"
+            + (f": {error}" if error else "")
+        )
+        return result
 
-        
     #now here migrating all the tenants
-    for tenant_id in qs:
-        migrate_single_tenant_task(tenant_id)
-        
-        
\ No newline at end of file
+    batches=rollout.batches(qs) if rollout else [("batch",qs)]
+    pool=None
+    if jobs>1:
+        # Forked workers inherit the graph instead of each reading it from disk
+        get_migration_loader()
+        pool=ProcessPoolExecutor(max_workers=jobs,initializer=_init_migration_worker)
+    halted=None
+    try:
+        for index,(label,batch) in enumerate(batches):
+            if rollout:
+                if index and rollout.pause:
+                    report(f"Pausing {rollout.pause}s before the next batch")
+                    time.sleep(rollout.pause)
+                report(f"{label.capitalize()} {index+1}/{len(batches)}: {len(batch)} tenant(s)")
+            if pool is None:
+                batch_results=[record(migrate_tenant_timed(tenant.id)) for tenant in batch]
+            else:
+                # Workers may be forked lazily on submit; never hand them the
+                # connection record() reopened for the previous batch.
+                _close_db_connections()
+                futures=[pool.submit(migrate_tenant_timed,tenant.id) for tenant in batch]
+                batch_results=[record(future.result()) for future in as_completed(futures)]
+            if rollout:
+                rollout.check(batch_results,is_canary=label=="canary")
+    except RolloutHalted as e:
+        halted=str(e)
+        report(f"Rollout halted: {halted}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    failed=[(tenant_id,error) for tenant_id,_,error in results if error]
+    timings=[seconds for _,seconds,_ in results]
+    with use_public_schema():
+        MigrationRun.objects.filter(id=run.id).update(
+            status="FAILED" if failed or halted else "COMPLETED",finished_at=timezone.now()
+        )
+    summary={
+        "run_id":str(run.id),
+        "tenants":len(results),
+        "failed":failed,
+        "halted":halted,
+        "elapsed":time.monotonic()-started,
+        "slowest":max(timings,default=0),
+        "average":sum(timings)/len(timings) if timings else 0,
+    }
+    report(
+        f"Migrated {len(results)-len(failed)}/{len(results)} tenants with {jobs} job(s) in {summary['elapsed']:.1f}s "
+        f"(avg {summary['average']:.2f}s, slowest {summary['slowest']:.2f}s)"
+    )
+    return summary
@@ -1,6 +1,6 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
@@ -380,4 +380,22 @@ def department_detail(request,schema_name, department_id):
         print(f"[ERROR] department_detail: {str(e)}")
         import traceback
         traceback.print_exc()
-        return HttpResponse(f"Error: {str(e)}")
\ No newline at end of file
+        return HttpResponse(f"Error: {str(e)}")
+
+
+def tenant_provisioning_status(request, subdomain):
+    """
+    Polled by the signup success page until the new tenant is READY. Only
+    the browser that signed the tenant up (or its logged-in owner) gets an
+    answer; anyone else sees the same 404 as for an unknown subdomain.
+    """
+    with use_public_schema(revert_schema_name=None, revert_schema=False):
+        tenant = Tenants.objects.filter(subdomain=subdomain).values('provisioning_status', 'owner_id').first()
+    allowed = tenant is not None and (
+        request.session.get('signup_subdomain') == subdomain
+        or (request.user.is_authenticated and tenant['owner_id'] == request.user.id)
+    )
+    if not allowed:
+        return JsonResponse({'status': None, 'ready': False}, status=404)
+    status = tenant['provisioning_status']
+    return JsonResponse({'status': status, 'ready': status == "READY", 'failed': status == "FAILED"})
@@ -1,3 +1,355 @@
-from django.test import TestCase
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from contextlib import contextmanager
+
+from . import fingerprints, lazy, migrator, pool, provisioning, status, tasks
+from .models import MigrationRun, PooledSchema, SchemaFingerprint, Tenants
+from .rollout import RolloutHalted, RolloutPolicy
+
+
+class LazyMigrateTestCase(SimpleTestCase):
+
+    def setUp(self):
+        lazy._current_schemas.clear()
+        patches = {
+            "does_schema_exists": mock.patch.object(lazy, "does_schema_exists", return_value=True),
+            "fingerprint": mock.patch.object(lazy, "schema_fingerprint_is_current", return_value=False),
+            "current": mock.patch.object(lazy, "schema_is_current", return_value=False),
+            "lock": mock.patch.object(lazy, "advisory_lock"),
+            "migrate": mock.patch.object(lazy, "migrate_schema_task"),
+            "cache": mock.patch.object(lazy, "cache"),
+        }
+        self.mocks = {name: patch.start() for name, patch in patches.items()}
+        self.mocks["cache"].get.return_value = None
+        self.addCleanup(mock.patch.stopall)
+
+    def test_migrates_schema_behind(self):
+        lazy.ensure_tenant_schema_current("tenant_acme")
+        self.mocks["lock"].assert_called_once_with("tenant-migrate:tenant_acme", "default")
+        self.mocks["migrate"].assert_called_once_with("tenant_acme", "default")
+
+    @override_settings(TENANT_SCHEMA_SCOPE="transaction")
+    def test_not_behind_a_transaction_pooler(self):
+        lazy.ensure_tenant_schema_current("tenant_acme")
+        self.mocks["lock"].assert_not_called()
+        self.mocks["migrate"].assert_not_called()
+
+
+class MigratorTestCase(SimpleTestCase):
+
+    def test_expected_migrations(self):
+        plan = migrator.expected_migrations()
+        self.assertIn(("attendance", "0005_partition_attendance"), plan)
+        # Dependencies come first, shared apps are pulled in only as such
+        self.assertLess(plan.index(("attendance", "0001_initial")), plan.index(("attendance", "0005_partition_attendance")))
+        self.assertEqual(len(plan), len(set(plan)))
+        self.assertIs(migrator.get_migration_loader(), migrator.get_migration_loader())
+
+    def test_with_replacements(self):
+        squashed = ("app", "0001_squashed_0002")
+        loader = SimpleNamespace(replacements={squashed: SimpleNamespace(replaces=[("app", "0001"), ("app", "0002")])})
+        with mock.patch.object(migrator, "get_migration_loader", return_value=loader):
+            self.assertIn(squashed, migrator.with_replacements({("app", "0001"), ("app", "0002")}))
+            self.assertNotIn(squashed, migrator.with_replacements({("app", "0001")}))
+
+    def test_partly_applied_squash_gets_a_full_graph(self):
+        squashed = ("app", "0001_squashed_0002")
+        loader = SimpleNamespace(replacements={squashed: SimpleNamespace(replaces=[("app", "0001"), ("app", "0002")])})
+        applied = mock.patch.object(migrator.MigrationRecorder, "applied_migrations")
+        with mock.patch.object(migrator, "get_migration_loader", return_value=loader), applied as applied_migrations:
+            applied_migrations.return_value = {("app", "0001"): None, ("app", "0002"): None}
+            executor = migrator.get_executor(connection)
+            self.assertIsInstance(executor, migrator.TenantMigrationExecutor)
+            self.assertIn(squashed, executor.loader.applied_migrations)
+
+            applied_migrations.return_value = {("app", "0001"): None}
+            self.assertNotIsInstance(migrator.get_executor(connection), migrator.TenantMigrationExecutor)
+
+
+class TenantMigrationStatusTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.plan = migrator.expected_migrations()
+        self.tenants = [
+            SimpleNamespace(id=n, subdomain=name, schema_name=f"tenant_{name}", db_alias="default")
+            for n, name in enumerate(["new", "behind", "current"])
+        ]
+        scanned = {"tenant_behind": set(self.plan[:-1]), "tenant_current": set(self.plan)}
+        self.scan = mock.patch.object(
+            status, "applied_migrations_by_schema",
+            side_effect=lambda names, using: {name: scanned[name] for name in names if name in scanned},
+        ).start()
+        mock.patch.object(status, "current_schemas", return_value={"tenant_current"}).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def rows(self, **kwargs):
+        return {row["subdomain"]: row for row in status.tenant_migration_status(self.tenants, **kwargs)}
+
+    def test_status(self):
+        rows = self.rows()
+        self.assertFalse(rows["new"]["initialized"])
+        self.assertEqual(len(rows["new"]["pending"]), len(self.plan))
+        app, name = self.plan[-1]
+        self.assertEqual(rows["behind"]["pending"], [f"{app}.{name}"])
+        self.assertEqual((rows["current"]["pending"], rows["current"]["up_to_date"]), ([], True))
+        # Fingerprint matched: its django_migrations is never read
+        self.scan.assert_called_once_with(["tenant_new", "tenant_behind"], using="default")
+
+    def test_without_fingerprints(self):
+        rows = self.rows(trust_fingerprints=False)
+        self.assertTrue(rows["current"]["up_to_date"])
+        self.scan.assert_called_once_with(["tenant_new", "tenant_behind", "tenant_current"], using="default")
+
+    def test_schema_is_current(self):
+        self.assertTrue(status.schema_is_current("tenant_current"))
+        self.assertFalse(status.schema_is_current("tenant_behind"))
+        self.assertFalse(status.schema_is_current("tenant_new"))
+
+
+@skipUnless(connection.vendor == "postgresql", "Reads pg_catalog")
+class AppliedMigrationsScanTestCase(TestCase):
+
+    def test_union_scan(self):
+        with connection.cursor() as cursor:
+            for schema_name, rows in (("scan_a", [("attendance", "0001_initial")]), ("scan_b", [])):
+                cursor.execute(f'CREATE SCHEMA "{schema_name}"')
+                cursor.execute(f'CREATE TABLE "{schema_name}".django_migrations (app text, name text)')
+                for app, name in rows:
+                    cursor.execute(f'INSERT INTO "{schema_name}".django_migrations VALUES (%s, %s)', [app, name])
+            cursor.execute('CREATE SCHEMA "scan_empty"')
+        with mock.patch.object(status, "SCAN_BATCH_SIZE", 1):
+            applied = status.applied_migrations_by_schema(["scan_a", "scan_b", "scan_empty", "scan_missing"])
+        self.assertEqual(applied, {"scan_a": {("attendance", "0001_initial")}, "scan_b": set()})
+
+
+class SchemaPoolTestCase(TestCase):
+
+    def setUp(self):
+        self.rename = mock.patch.object(pool, "rename_schema").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_claim(self):
+        PooledSchema.objects.create(schema_name="pool_a")
+        PooledSchema.objects.create(schema_name="pool_b")
+        PooledSchema.objects.filter(schema_name="pool_b").update(created_at=timezone.now() + timedelta(minutes=1))
+        SchemaFingerprint.objects.create(schema_name="pool_a", fingerprint="f" * 64)
+        self.assertTrue(pool.claim_pooled_schema("tenant_acme"))
+        self.rename.assert_called_once_with("pool_a", "tenant_acme", "default")
+        self.assertEqual(list(PooledSchema.objects.values_list("schema_name", flat=True)), ["pool_b"])
+        self.assertEqual(SchemaFingerprint.objects.get().schema_name, "tenant_acme")
+
+    def test_empty_pool(self):
+        PooledSchema.objects.create(schema_name="pool_a", db_alias="shard1")
+        self.assertFalse(pool.claim_pooled_schema("tenant_acme"))
+        self.rename.assert_not_called()
+
+    def test_fill(self):
+        PooledSchema.objects.create(schema_name="pool_a")
+        with mock.patch.object(pool, "migrate_schema_task") as migrate:
+            self.assertEqual(pool.fill_schema_pool(size=3), 2)
+            self.assertEqual(pool.fill_schema_pool(size=3), 0)
+        self.assertEqual(migrate.call_count, 2)
+        self.assertEqual(PooledSchema.objects.count(), 3)
+
+
+class ProvisioningTestCase(TestCase):
+
+    def setUp(self):
+        self.provision_schema = mock.patch.object(provisioning, "provision_tenant_schema").start()
+        self.addCleanup(mock.patch.stopall)
+        self.tenant = Tenants.objects.create(subdomain="acme")
+
+    def status(self):
+        self.tenant.refresh_from_db()
+        return self.tenant.provisioning_status
+
+    def test_new_tenant_is_enqueued(self):
+        with mock.patch.object(provisioning, "enqueue_provisioning") as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                tenant = Tenants.objects.create(subdomain="beta")
+            tenant.save()
+        enqueue.assert_called_once_with(tenant.id)
+        self.assertEqual(tenant.provisioning_status, "PENDING")
+
+    def test_pending_to_ready(self):
+        self.assertTrue(provisioning.provision_tenant(self.tenant.id))
+        self.assertEqual(self.status(), "READY")
+        self.assertIsNotNone(self.tenant.provisioned_at)
+        self.assertEqual(self.provision_schema.call_args.args[0].id, self.tenant.id)
+
+    def test_failure_is_recorded_and_retried(self):
+        self.provision_schema.side_effect = RuntimeError("disk full")
+        self.assertFalse(provisioning.provision_tenant(self.tenant.id))
+        self.assertEqual(self.status(), "FAILED")
+        self.assertEqual(self.tenant.provisioning_error, "RuntimeError: disk full")
+
+        self.provision_schema.side_effect = None
+        self.assertTrue(provisioning.provision_tenant(self.tenant.id))
+        self.assertEqual(self.status(), "READY")
+        self.assertEqual(self.tenant.provisioning_error, "")
+
+    def test_ready_and_running_are_not_claimed(self):
+        provisioning.provision_tenant(self.tenant.id)
+        self.assertFalse(provisioning.provision_tenant(self.tenant.id))
+        self.assertTrue(provisioning.provision_tenant(self.tenant.id, force=True))
+        Tenants.objects.filter(id=self.tenant.id).update(provisioning_status="PROVISIONING")
+        self.assertFalse(provisioning.provision_tenant(self.tenant.id, force=True))
+        self.assertEqual(self.provision_schema.call_count, 2)
+
+    def test_requeue_stale(self):
+        old = timezone.now() - timedelta(hours=1)
+        Tenants.objects.filter(id=self.tenant.id).update(provisioning_status="PROVISIONING", updated=old)
+        fresh = Tenants.objects.create(subdomain="beta")
+        Tenants.objects.filter(id=fresh.id).update(provisioning_status="PROVISIONING")
+
+        @contextmanager
+        def held(name, using="default", wait=True):
+            yield False
+
+        with mock.patch.object(provisioning, "advisory_lock", held):
+            self.assertEqual(provisioning.requeue_stale_provisioning(timedelta(minutes=15)), 0)
+        self.assertEqual(provisioning.requeue_stale_provisioning(timedelta(minutes=15)), 1)
+        self.assertEqual(self.status(), "PENDING")
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.provisioning_status, "PROVISIONING")
+
+    def test_in_process_provisioning(self):
+        with mock.patch.object(provisioning.threading, "Thread") as thread:
+            provisioning.enqueue_provisioning(self.tenant.id)
+            thread.assert_not_called()
+            with override_settings(TENANT_PROVISION_IN_PROCESS=True):
+                provisioning.enqueue_provisioning(self.tenant.id)
+        thread.assert_called_once_with(target=provisioning._provision_in_thread, args=(self.tenant.id,), daemon=True)
+
+
+class MigrationRunTestCase(TestCase):
+
+    def setUp(self):
+        mock.patch.object(tasks, "call_command").start()
+        self.addCleanup(mock.patch.stopall)
+        self.acme = Tenants.objects.create(subdomain="acme")
+        self.beta = Tenants.objects.create(subdomain="beta")
+        self.current = Tenants.objects.create(subdomain="current")
+        self.failing = {self.beta.id}
+
+        def migrate_tenant_timed(tenant_id):
+            return tenant_id, 0.5, "RuntimeError: lock timeout" if tenant_id in self.failing else None
+
+        self.migrate = mock.patch.object(tasks, "migrate_tenant_timed", side_effect=migrate_tenant_timed).start()
+        mock.patch.object(tasks, "tenant_migration_status", return_value=[
+            {"id": str(tenant.id), "up_to_date": tenant == self.current}
+            for tenant in (self.acme, self.beta, self.current)
+        ]).start()
+
+    def checkpoints(self, run_id):
+        return dict(MigrationRun.objects.get(id=run_id).tenants.values_list("tenant_id", "status"))
+
+    def test_checkpoints_and_resume(self):
+        summary = tasks.migrate_all_tenant_schema_task(report=lambda message: None)
+        self.assertEqual(summary["failed"], [(self.beta.id, "RuntimeError: lock timeout")])
+        self.assertEqual(self.checkpoints(summary["run_id"]), {self.acme.id: "OK", self.beta.id: "FAILED"})
+        self.assertEqual(MigrationRun.objects.get(id=summary["run_id"]).status, "FAILED")
+
+        self.failing.clear()
+        self.migrate.reset_mock()
+        summary = tasks.migrate_all_tenant_schema_task(report=lambda message: None, resume=summary["run_id"])
+        self.migrate.assert_called_once_with(self.beta.id)
+        self.assertEqual(summary["failed"], [])
+        self.assertEqual(self.checkpoints(summary["run_id"]), {self.acme.id: "OK", self.beta.id: "OK"})
+        run = MigrationRun.objects.get(id=summary["run_id"])
+        self.assertEqual(run.status, "COMPLETED")
+        self.assertIsNotNone(run.finished_at)
+
+    def test_force(self):
+        summary = tasks.migrate_all_tenant_schema_task(report=lambda message: None, force=True)
+        self.assertEqual(len(self.checkpoints(summary["run_id"])), 3)
+
+    def test_halted_rollout_is_resumable(self):
+        rollout = RolloutPolicy(canary_subdomains=["beta"], canary_percent=0, pause=0)
+        summary = tasks.migrate_all_tenant_schema_task(report=lambda message: None, rollout=rollout)
+        self.assertEqual(summary["halted"], "1 canary tenant(s) failed")
+        self.migrate.assert_called_once_with(self.beta.id)
+        self.assertEqual(self.checkpoints(summary["run_id"]), {self.acme.id: "PENDING", self.beta.id: "FAILED"})
+
+
+class RolloutPolicyTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.tenants = [SimpleNamespace(id=n, subdomain=f"t{n}") for n in range(100)]
+
+    def test_batches(self):
+        policy = RolloutPolicy(canary_subdomains=["t42"], canary_percent=5, first_batch=10, growth=2, max_batch=30)
+        batches = policy.batches(self.tenants)
+        self.assertEqual([label for label, _ in batches], ["canary"] + ["batch"] * 5)
+        self.assertEqual([len(batch) for _, batch in batches], [6, 10, 20, 30, 30, 4])
+        canary = batches[0][1]
+        self.assertEqual(canary[0].subdomain, "t42")
+        rolled_out = [tenant.id for _, batch in batches for tenant in batch]
+        self.assertCountEqual(rolled_out, range(100))
+
+        # Same sample whatever order the tenants come in
+        reordered = policy.batches(reversed(self.tenants))
+        self.assertEqual({t.id for t in reordered[0][1]}, {t.id for t in canary})
+
+    def test_no_canary(self):
+        batches = RolloutPolicy(canary_percent=0, first_batch=60).batches(self.tenants)
+        self.assertEqual([(label, len(batch)) for label, batch in batches], [("batch", 60), ("batch", 40)])
+
+    def test_check(self):
+        policy = RolloutPolicy(max_seconds=10, max_error_rate=0.2)
+        ok = [(n, 1.0, None) for n in range(9)]
+        policy.check(ok + [(9, 2.0, "boom")])
+        policy.check([])
+        for results, is_canary in (
+            (ok + [(9, 2.0, "boom")], True),
+            (ok[:3] + [(8, 1.0, "boom"), (9, 1.0, "boom")], False),
+            (ok + [(9, 11.0, None)], False),
+        ):
+            with self.subTest(results=results, is_canary=is_canary), self.assertRaises(RolloutHalted):
+                policy.check(results, is_canary=is_canary)
+
+
+class FingerprintTestCase(TestCase):
+
+    def test_fingerprint(self):
+        keys = [("tenants", "0001_initial"), ("accounts", "0002_profile")]
+        self.assertEqual(fingerprints.fingerprint(keys), fingerprints.fingerprint(reversed(keys)))
+        self.assertNotEqual(fingerprints.fingerprint(keys), fingerprints.fingerprint(keys[:1]))
+        self.assertEqual(len(fingerprints.fingerprint([])), 64)
+
+    def test_schema_fingerprint(self):
+        # The test database has every migration applied
+        self.assertEqual(fingerprints.schema_fingerprint(connection), fingerprints.code_fingerprint())
+        self.assertEqual(
+            fingerprints.schema_fingerprint(connection, migrator.expected_migrations()),
+            fingerprints.tenant_code_fingerprint(),
+        )
+
+    def test_stored_fingerprints(self):
+        current = fingerprints.tenant_code_fingerprint()
+        self.assertIsNone(fingerprints.get_stored_fingerprint("tenant_acme"))
+        fingerprints.store_fingerprint("tenant_acme", "0" * 64)
+        fingerprints.store_fingerprint("tenant_beta", current)
+        self.assertFalse(fingerprints.schema_fingerprint_is_current("tenant_acme"))
+        self.assertEqual(fingerprints.current_schemas(["tenant_acme", "tenant_beta", "tenant_new"]), {"tenant_beta"})
+
+        fingerprints.store_fingerprint("tenant_acme", current)
+        self.assertTrue(fingerprints.schema_fingerprint_is_current("tenant_acme"))
+        self.assertFalse(fingerprints.schema_fingerprint_is_current("tenant_acme", using="other"))
+        self.assertEqual(SchemaFingerprint.objects.count(), 2)
+
+    def test_outdated_tenants(self):
+        current, stale, missing, pending = (
+            Tenants.objects.create(subdomain=subdomain) for subdomain in ("current", "stale", "missing", "pending")
+        )
+        Tenants.objects.exclude(id=pending.id).update(provisioning_status="READY")
+        fingerprints.store_fingerprint(current.schema_name, fingerprints.tenant_code_fingerprint(), current.db_alias)
+        fingerprints.store_fingerprint(stale.schema_name, "0" * 64, stale.db_alias)
+        fingerprints.store_fingerprint(pending.schema_name, "0" * 64, pending.db_alias)
+        self.assertCountEqual(fingerprints.outdated_tenants(), [stale, missing])
@@ -1,9 +1,10 @@
 from django.urls import path
-from .tenant_views import hr_approval_list,hr_approval_detail,department_detail
+from .tenant_views import hr_approval_list,hr_approval_detail,department_detail,tenant_provisioning_status
 urlpatterns = [
     path('hr-approvals/<str:schema_name>', hr_approval_list, name='hr-approval-list'),
     path('hr-approval/<str:schema_name>/<uuid:application_id>/', hr_approval_detail, name='hr-approval-detail'),
     path('department/<str:schema_name>/<uuid:department_id>/', department_detail, name='department-detail'),
+    path('provisioning-status/<str:subdomain>/', tenant_provisioning_status, name='tenant-provisioning-status'),
     # path("<str:pk>/", tenant_detail_view),
     # path("<str:pk>/new-user/", tenant_createuser__view),
 ]
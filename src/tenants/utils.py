@@ -1,2 +1,22 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count
+
+
 def generate_schema_name(tenant_id):
-    return f"tenant {tenant_id}"
\ No newline at end of file
+    return f"tenant {tenant_id}"
+
+
+def choose_tenant_shard():
+    """Place a new tenant on the configured shard holding the fewest tenants"""
+    shards = getattr(settings, "TENANT_PLACEMENT_SHARDS", None) or [DEFAULT_DB_ALIAS]
+    if len(shards) == 1:
+        return shards[0]
+    Tenants = apps.get_model('tenants', 'Tenants')
+    counts = dict(
+        Tenants.objects.filter(db_alias__in=shards)
+        .values_list('db_alias')
+        .annotate(total=Count('id'))
+    )
+    return min(shards, key=lambda alias: counts.get(alias, 0))